@@ -0,0 +1,213 @@
+#script purpose: time the main stages of metmodelCLI on the bundled model_organisms models, and compare two runs for regressions
+#usage:
+#	python benchmark.py [-o results.json] [--solver glpk|glpsol] [--repeat 3] [--knockouts 100] [model_organisms/cthmodel.txt ...]
+#	python benchmark.py --compare old.json new.json [--tolerance 0.10]
+#stages timed for each model (best and mean of --repeat runs, in seconds):
+#	load_mm2 (build_from_mm2, parsing the text file, no cache), load_textfiles (build_from_textfiles on the model's .model / .exchanges / .gpr files),
+#	write_lp, solve (from scratch), knockouts (a scan knocking out the first --knockouts reactions, one at a time), list_reactions
+#each model runs in its own process, so peak_rss_kb is that model's peak resident memory
+
+import os, sys, time, json, inspect, resource, tempfile, subprocess		#standard Python modules
+from optparse import OptionParser								#standard Python module
+
+MODELS = ['model_organisms/cthmodel.txt', 'model_organisms/ssamodel.txt', 'model_organisms/ssamodel2.txt']
+
+#compare mode: a stage is flagged if it is slower by more than the tolerance and by more than MIN_SECONDS (timer noise on tiny stages)
+MIN_SECONDS = 0.002
+
+
+def peak_rss_kb ():
+	#peak resident set size of this process (ru_maxrss is in kilobytes on Linux, bytes on Mac OS X)
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		rss = rss / 1024
+	return rss
+
+
+def timed (function, repeat):
+	#run function 'repeat' times; returns {best, mean, runs} in seconds
+	runs = []
+	for i in range(repeat):
+		start = time.time()
+		function()
+		runs.append(time.time() - start)
+	return {'best':min(runs), 'mean':sum(runs) / len(runs), 'runs':runs}
+
+
+#the script also times trees older than the APIs it prefers (to measure a baseline): each is checked for, with the older way as fallback
+
+def new_model (mm2file, solver):
+	import metmodelCLI
+	m = metmodelCLI.cb()
+	if 'cache' in inspect.getargspec(metmodelCLI.cb.build_from_mm2)[0]:
+		m.build_from_mm2(mm2file, readquiet=True, cache=False)
+	else:
+		m.build_from_mm2(mm2file, readquiet=True)
+	m.set_objective('Maximize', 'R_BIOMASS')
+	if solver:
+		if not hasattr(m, 'set_solver'):
+			raise ValueError('--solver %s: this metmodelCLI has no set_solver (it always runs glpsol)' % (solver))
+		m.set_solver(solver)
+	return m
+
+
+def solve_from_scratch (m):
+	#a solve that reuses nothing from earlier ones (without a solver session, every solve is one)
+	if hasattr(m, 'reset_session'):
+		m.reset_session()
+	m.solve(verbose=False)
+
+
+def knockout (m, r):
+	#solve with reaction r constrained to zero flux, then put its constraint back
+	if hasattr(m, 'knockout'):
+		return m.knockout([r])
+	constraint = m.CONSTRAINTS.get(r)
+	m.set_constraint(r, 0, 0)
+	m.solve(verbose=False)
+	if constraint:
+		m.set_constraint(r, constraint[0], constraint[1])
+	else:
+		m.unset_constraint(r)
+
+
+def knockout_targets (m, knockouts):
+	#the first 'knockouts' reactions (sorted) other than sources, escapes, exchanges and the objective, as cb.deletion_candidates picks them
+	return sorted([r for r in m.REACTIONS if not ('R_SRC' in r or 'R_ESC' in r or 'R_EXCH' in r or r == m.OBJECTIVE[1])])[:knockouts]
+
+
+def side_files (mm2file):
+	#.model / .exchanges / .gpr text files of an mm2 model: the mm2 file name without its extension and a trailing 'model'
+	#('cthmodel.txt' -> 'cth.model.txt', ...), or, if there are none of those, the names the old build_from_mm2 wrote,
+	#which cut the last 9 characters whatever they were ('ssamodel2.txt' -> 'ssam.model.txt')
+	prefix = os.path.splitext(mm2file)[0]
+	if prefix.endswith('model'):
+		prefix = prefix[:-len('model')]
+	for stem in (prefix, mm2file[:-len('model.txt')]):
+		names = (stem + '.model.txt', stem + '.exchanges.txt', stem + '.gpr.txt')
+		if [filename for filename in names if os.path.exists(filename)]:
+			return names
+	return prefix + '.model.txt', prefix + '.exchanges.txt', prefix + '.gpr.txt'
+
+
+def benchmark_model (mm2file, solver, repeat, knockouts):
+	"Time each stage on one model; returns {'stages':{stage:{best, mean, runs}}, 'total', 'peak_rss_kb', ...}."
+	import metmodelCLI
+	stages = {}
+	workdir = tempfile.mkdtemp(prefix='benchmark.')
+
+	stages['load_mm2'] = timed(lambda: new_model(mm2file, solver), repeat)
+
+	modelfile, exchangesfile, gprfile = side_files(mm2file)
+	if os.path.exists(modelfile) or os.path.exists(exchangesfile) or os.path.exists(gprfile):
+		missing = [filename for filename in (modelfile, exchangesfile, gprfile) if not os.path.exists(filename)]
+		if missing:
+			raise IOError('load_textfiles needs the side files of %s; missing: %s' % (mm2file, ', '.join(missing)))
+		def load_textfiles ():
+			m = metmodelCLI.cb()
+			m.build_from_textfiles(modelfile, exchangesfile=exchangesfile, gprfile=gprfile, readquiet=True)
+		stages['load_textfiles'] = timed(load_textfiles, repeat)
+	else:
+		print >>sys.stderr, 'no %s, %s or %s: load_textfiles not timed for %s' % (modelfile, exchangesfile, gprfile, mm2file)
+
+	m = new_model(mm2file, solver)
+	lpfilename = os.path.join(workdir, 'model.lp')
+	stages['write_lp'] = timed(lambda: m.write_lp(lpfilename), repeat)
+
+	stages['solve'] = timed(lambda: solve_from_scratch(m), repeat)
+	status, objectivevalue = m.STATUS, m.OBJECTIVE_VALUE
+
+	targets = knockout_targets(m, knockouts)
+	def knockout_scan ():
+		solve_from_scratch(m)
+		for r in targets:
+			knockout(m, r)
+	stages['knockouts'] = timed(knockout_scan, repeat)
+
+	m.solve(verbose=False)
+	xlsfilename = os.path.join(workdir, 'model.xls')
+	stages['list_reactions'] = timed(lambda: m.list_reactions(out=xlsfilename), repeat)
+
+	for filename in os.listdir(workdir):
+		os.remove(os.path.join(workdir, filename))
+	os.rmdir(workdir)
+
+	return {'stages':stages, 'total':sum([stage['best'] for stage in stages.values()]), 'peak_rss_kb':peak_rss_kb(),
+			'reactions':len(m.REACTIONS), 'knockouts':len(targets), 'solver':getattr(m, 'SOLVER', 'glpsol'), 'status':status, 'objective':objectivevalue}
+
+
+def run (models, solver, repeat, knockouts):
+	"Benchmark each model in a fresh Python process (separate peak RSS); returns the results document."
+	results = {'python':sys.version.split()[0], 'platform':sys.platform, 'time':time.strftime('%Y-%m-%d %H:%M:%S'),
+				'repeat':repeat, 'models':{}}
+	for mm2file in models:
+		command = [sys.executable, os.path.abspath(__file__), '--single', mm2file, '--repeat', str(repeat), '--knockouts', str(knockouts)]
+		if solver:
+			command.extend(['--solver', solver])
+		child = subprocess.Popen(command, stdout=subprocess.PIPE)
+		output = child.communicate()[0]
+		if child.returncode != 0:
+			print >>sys.stderr, 'benchmark of %s failed' % (mm2file)
+			continue
+		#the results are the last line (anything the model code printed comes before it)
+		results['models'][os.path.basename(mm2file)] = json.loads(output.strip().splitlines()[-1])
+		print >>sys.stderr, '%s\t%.3f s' % (mm2file, results['models'][os.path.basename(mm2file)]['total'])
+	return results
+
+
+def compare (old, new, tolerance):
+	"Print old vs new best times (and peak RSS) for every model / stage both runs have; returns the number of regressions."
+	regressions = 0
+	print 'model\tstage\told\tnew\tratio\t'
+	for model in sorted(old['models']):
+		if not model in new['models']:
+			continue
+		a, b = old['models'][model], new['models'][model]
+		for setting in ('solver', 'knockouts'):
+			if a.get(setting) != b.get(setting):
+				print '%s\tnote: %s differs (%s vs %s); times are not like for like' % (model, setting, a.get(setting), b.get(setting))
+		rows = []
+		for stage in sorted(a['stages']):
+			if stage in b['stages']:
+				rows.append((stage, a['stages'][stage]['best'], b['stages'][stage]['best'], MIN_SECONDS))
+		rows.append(('total', a['total'], b['total'], MIN_SECONDS))
+		rows.append(('peak_rss_kb', a['peak_rss_kb'], b['peak_rss_kb'], 1024))
+		for stage, before, after, noise in rows:
+			ratio = float(after) / max(before, 1e-9)
+			flag = ''
+			if ratio > 1 + tolerance and after - before > noise:
+				flag = 'REGRESSION'
+				regressions += 1
+			elif ratio < 1 - tolerance and before - after > noise:
+				flag = 'improved'
+			print '%s\t%s\t%.4g\t%.4g\t%.2f\t%s' % (model, stage, before, after, ratio, flag)
+	return regressions
+
+
+if __name__ == '__main__':
+	parser = OptionParser(usage='%prog [options] [mm2 model files]\n       %prog --compare old.json new.json')
+	parser.add_option('-o', '--out', help='write the JSON results to this file (default: standard output)')
+	parser.add_option('--solver', help="LP backend: 'glpk' or 'glpsol' (default: the model's default)")
+	parser.add_option('--repeat', type='int', default=3, help='runs per stage; the best is compared (default 3)')
+	parser.add_option('--knockouts', type='int', default=100, help='reactions knocked out in the scan stage (default 100)')
+	parser.add_option('--compare', action='store_true', help='compare two results files and flag regressions (exit status 1 if any)')
+	parser.add_option('--tolerance', type='float', default=0.10, help='slowdown flagged as a regression in compare mode (default 0.10 = 10%)')
+	parser.add_option('--single', help='(internal) benchmark one model in this process and print its JSON')
+	options, args = parser.parse_args()
+
+	if options.single:
+		print json.dumps(benchmark_model(options.single, options.solver, options.repeat, options.knockouts))
+	elif options.compare:
+		if len(args) != 2:
+			parser.error('--compare needs two results files')
+		old, new = json.load(open(args[0])), json.load(open(args[1]))
+		if compare(old, new, options.tolerance):
+			sys.exit(1)
+	else:
+		results = run(args or MODELS, options.solver, options.repeat, options.knockouts)
+		if options.out:
+			outfile = open(options.out, 'w')
+			json.dump(results, outfile, indent=1, sort_keys=True)
+			outfile.close()
+		else:
+			print json.dumps(results, indent=1, sort_keys=True)
@@ -0,0 +1,226 @@
+#script purpose: network compression for metmodelCLI.cb.compress: remove blocked reactions and lump reactions coupled through linear chains
+	#works on the compiled stoichiometric matrix (stoich.smatrix); the reduced matrix has one column per kept reaction or lump
+	#uses only standard Python modules
+
+"""
+data structures in a compression:
+
+full -> stoich.smatrix						the matrix before compression (restored by cb.uncompress)
+removed -> { reactionID : 1 }				blocked reactions, left out of the LP; their flux is 0
+column -> { reactionID : (columnID, factor) }	for every reaction in the LP: flux of the reaction = factor * flux of the column
+members -> { columnID : [ (reactionID, factor), ... ] }		reactions merged into each column, the column's own reaction first (factor 1.0)
+directions -> { reactionID : (backward, forward) }			directions each reaction could carry flux in when compressed (lb < 0, ub > 0)
+
+A column is named after one of its reactions (the objective, if it is in the lump), so the reduced LP reads like the model.
+
+Blocked reactions are found from the network alone: a balanced metabolite must be consumed by some reaction for another
+to make it (and the other way round), so reactions that can only make (or only use) a dead end metabolite are blocked,
+repeated until nothing changes. A balanced metabolite left in exactly two reactions couples their fluxes at a fixed ratio
+(a * v1 + b * v2 = 0), and chains of such couplings are lumped into one column. Both depend on the directions allowed by
+the bounds when compressed; cb.update_bounds uncompresses if a later bound opens a new direction.
+"""
+
+from array import array		#standard Python module
+import stoich				#custom module
+
+
+def directions (S):
+	#(backward, forward) for each column of S: whether its bounds let it run that way
+	return [S.lb[j] < 0 for j in range(len(S.reactions))], [S.ub[j] > 0 for j in range(len(S.reactions))]
+
+
+def blocked_reactions (S):
+	"Columns of S that cannot carry flux at steady state (dead ends), given the directions their bounds allow."
+	backward, forward = directions(S)
+	indptr, cols, coefs = S.csr()
+	queue = [i for i in range(len(S.metabolites)) if S.balanced[i]]
+	queued = dict.fromkeys(queue)
+	while queue:
+		i = queue.pop()
+		del queued[i]
+		#reactions that can make / use the metabolite in a direction still open to them
+		makers, users = {}, {}
+		for k in range(indptr[i], indptr[i + 1]):
+			j, coef = cols[k], coefs[k]
+			if (coef > 0 and forward[j]) or (coef < 0 and backward[j]):
+				makers[j] = 1
+			if (coef < 0 and forward[j]) or (coef > 0 and backward[j]):
+				users[j] = 1
+		#a reaction can only make the metabolite if another reaction can use it, and the other way round
+		for k in range(indptr[i], indptr[i + 1]):
+			j, coef = cols[k], coefs[k]
+			closed = []
+			if j in makers and len(users) - (j in users) == 0:
+				closed.append(coef > 0)
+			if j in users and len(makers) - (j in makers) == 0:
+				closed.append(coef < 0)
+			for direction in closed:
+				if direction:
+					forward[j] = False
+				else:
+					backward[j] = False
+			if closed:
+				for row in S.columns[j][0]:
+					if S.balanced[row] and not row in queued:
+						queued[row] = None
+						queue.append(row)
+	return [j for j in range(len(S.reactions)) if not (forward[j] or backward[j])]
+
+
+def find (parent, factor, j):
+	#root of j's lump, with factor[j] made relative to the root (flux j = factor[j] * flux root)
+	path = []
+	while parent[j] != j:
+		path.append(j)
+		j = parent[j]
+	for k in reversed(path):
+		if parent[k] != j:
+			factor[k] *= factor[parent[k]]
+			parent[k] = j
+	return j
+
+
+def couplings (S, removed):
+	"Lumps of columns of S coupled through metabolites left in exactly two (not removed) columns: ({ root : [(j, factor), ...] }, columns found blocked)."
+	indptr, cols, coefs = S.csr()
+	parent, factor = range(len(S.reactions)), [1.0] * len(S.reactions)
+	#a reaction whose bounds exclude zero is never lumped: a knockout elsewhere in its lump would leave the lump no feasible flux
+	fixed = dict([(j, 1) for j in range(len(S.reactions)) if S.lb[j] > 0 or S.ub[j] < 0])
+	inconsistent = {}
+	for i in range(len(S.metabolites)):
+		if not S.balanced[i]:
+			continue
+		entries = [(cols[k], coefs[k]) for k in range(indptr[i], indptr[i + 1]) if not cols[k] in removed]
+		if len(entries) != 2 or entries[0][0] in fixed or entries[1][0] in fixed:
+			continue
+		(j1, a), (j2, b) = entries
+		#a * v1 + b * v2 = 0, so v2 = ratio * v1
+		ratio = -a / b
+		root1, root2 = find(parent, factor, j1), find(parent, factor, j2)
+		if root1 == root2:
+			#already in one lump; a second coupling at a different ratio means both fluxes (and so the lump) must be 0
+			if abs(factor[j2] - ratio * factor[j1]) > 1e-9 * max(abs(factor[j2]), abs(ratio * factor[j1])):
+				inconsistent[root1] = 1
+			continue
+		#hang root2 under root1: v_root2 = v_j2 / factor[j2] = ratio * factor[j1] / factor[j2] * v_root1
+		parent[root2] = root1
+		factor[root2] = ratio * factor[j1] / factor[j2]
+	lumps = {}
+	for j in range(len(S.reactions)):
+		if not j in removed:
+			root = find(parent, factor, j)
+			lumps.setdefault(root, []).append((j, factor[j]))
+	blocked = []
+	for root in inconsistent:
+		root = find(parent, factor, root)
+		blocked.extend([j for j, f in lumps.pop(root, [])])
+	return lumps, blocked
+
+
+def lump_bounds (members):
+	"Bounds on a column from (factor, lb, ub) of each of its reactions (flux = factor * column flux); None if they leave no flux."
+	lbound, ubound = float('-inf'), float('inf')
+	for factor, lb, ub in members:
+		low, high = lb / factor, ub / factor
+		if factor < 0:
+			low, high = high, low
+		lbound, ubound = max(lbound, low), min(ubound, high)
+	if lbound > ubound:
+		#round-off in the factors
+		if lbound - ubound > 1e-9 * max(1.0, abs(lbound)):
+			return None
+		lbound = ubound
+	return lbound, ubound
+
+
+class compression:
+	"Mapping between the reactions of a model and the columns of its compressed stoichiometric matrix."
+
+	def __init__ (self, S, objective=None):
+		#compress matrix S (left unchanged, as self.full); objective names the reaction to prefer as the name of its lump
+		self.full = S
+		backward, forward = directions(S)
+		self.directions = dict(zip(S.reactions, zip(backward, forward)))
+		removed = dict.fromkeys(blocked_reactions(S), 1)
+		lumps, blocked = couplings(S, removed)
+		for j in blocked:
+			removed[j] = 1
+		self.removed = dict([(S.reactions[j], 1) for j in removed])
+		self.column, self.members = {}, {}
+		for root in sorted(lumps):
+			lump = lumps[root]
+			#the column is named after the objective if it is in the lump, otherwise after the lump's first reaction
+			first = 0
+			for n, (j, factor) in enumerate(lump):
+				if S.reactions[j] == objective:
+					first = n
+			lump = [lump[first]] + lump[:first] + lump[first + 1:]
+			scale = lump[0][1]
+			name = S.reactions[lump[0][0]]
+			self.members[name] = [(S.reactions[j], factor / scale) for j, factor in lump]
+			for reaction, factor in self.members[name]:
+				self.column[reaction] = (name, factor)
+
+
+	def reduce (self):
+		"The compressed matrix: full's rows, and one column per kept reaction or lump, in the order of full's columns."
+		S, R = self.full, stoich.smatrix()
+		R.metabolites, R.metabolite2index, R.balanced = list(S.metabolites), S.metabolite2index.copy(), array('b', S.balanced)
+		for j, ID in enumerate(S.reactions):
+			if not ID in self.members:
+				continue
+			members = self.members[ID]
+			if len(members) == 1:
+				R.add_column(ID, S.columns[j], S.lb[j], S.ub[j])
+				continue
+			entries, scale = {}, {}
+			for reaction, factor in members:
+				rows, coefs = S.columns[S.reaction2index[reaction]]
+				for row, coef in zip(rows, coefs):
+					entries[row] = entries.get(row, 0.0) + factor * coef
+					scale[row] = max(scale.get(row, 0.0), abs(factor * coef))
+			#metabolites passed along the chain cancel (up to round-off)
+			rows = [row for row in sorted(entries) if abs(entries[row]) > 1e-12 * scale[row]]
+			bounds = lump_bounds([(factor,) + S.bounds(reaction) for reaction, factor in members])
+			R.add_column(ID, (array('i', rows), array('d', [entries[row] for row in rows])), bounds[0], bounds[1])
+		return R
+
+
+	def widens (self, reaction, lbound, ubound):
+		"True if bounds (lbound, ubound) let a reaction carry flux in a direction it could not when compressed."
+		backward, forward = self.directions.get(reaction, (True, True))
+		return (lbound < 0 and not backward) or (ubound > 0 and not forward)
+
+
+	def columns (self, reactions):
+		"Sorted column IDs the given reactions are merged into (removed reactions have none)."
+		return tuple(sorted(dict([(self.column[r][0], 1) for r in reactions if r in self.column])))
+
+
+	def objective (self, reaction):
+		#(columnID, factor) standing in for an objective on a reaction; a removed (blocked) reaction gets factor 0 on any column
+		if reaction in self.column:
+			return self.column[reaction]
+		if reaction in self.removed and self.members:
+			return (min(self.members), 0.0)
+		return (reaction, 1.0)
+
+
+	def expand (self, column2value, formatter):
+		"{ reactionID : formatter(value) } for every reaction, from { columnID : value string } (removed reactions are 0)."
+		values = {}
+		for column in column2value:
+			value = column2value[column]
+			for reaction, factor in self.members.get(column, [(column, 1.0)]):
+				if factor == 1.0:
+					values[reaction] = value
+				else:
+					values[reaction] = formatter(factor * float(value))
+		for reaction in self.removed:
+			values[reaction] = formatter(0.0)
+		return values
+
+
+	def summary (self):
+		return {'reactions':len(self.full.reactions), 'columns':len(self.members), 'removed':len(self.removed),
+				'lumped':len([r for r in self.column if len(self.members[self.column[r][0]]) > 1])}
@@ -16,11 +16,15 @@ False, [[('M_gtp_c', '1'), ('M_h2o_c', '3')], [('M_25dhpp_c', '1'), ('M_for_c',
 
 First member of tuple tells whether reaction is reversible, second looks like this:
 [[(reactant1, coefficient_reactant1), (reactant2, coefficient_reactant2), ...], [(product1, coefficient_product1), (product2, coefficient_product2), ...]]
+
+parse(rxnequation, numeric=True) gives the coefficients as floats instead of strings (e.g. 2.0 rather than '2'); parse_all parses a whole list of equations.
+parse_split is the original parser (splits the equation string once per step); parse gives the same results (see parse.benchmark.py).
 """
 
+import re			#standard Python module
+
 
 def no_compartment(rxnequation, splitter):
-	print rxnequation, splitter
 	raw_equation_array = [rxnequation.split(splitter)[0].split(' + '), rxnequation.split(splitter)[1].split(' + ')]
 	equation_array = [[], []]
 	for i, side in enumerate(raw_equation_array):
@@ -78,7 +82,8 @@ def multi_compartment(rxnequation, splitter):
 		return equation_array
 
 
-def parse (rxnequation):
+def parse_split (rxnequation):
+	#original parser, kept for comparison with parse (see parse.benchmark.py)
 	#two main decisions that will determine how rxnequation is parsed:
 	#1. is it reversible or not?
 	#2. is it within a single compartment or not?
@@ -124,11 +129,93 @@ def parse (rxnequation):
 	return reversibility, equation	
 		
 		
+#::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+
+
+#every arrow determine_reversibility knows, longest first, so one regular expression scan finds the arrow: arrow -> (reversible, written right to left)
+ARROWS = {'<==>':(True, False), '-->':(False, False), '<--':(False, True), '<=>':(True, False), '=>':(False, False), '<=':(False, True), '=':(True, False)}
+arrow_re = re.compile(r' (<==>|-->|<--|<=>|=>|<=|=) ')
+
+#(compartment suffix, numeric) -> { term as written : (interned species ID, coefficient) }, shared by all equations parsed;
+#terms like 'atp', 'h' or '2 h' recur in most equations, so most terms are a single dictionary lookup.
+#a table holding TERMS_LIMIT terms is cleared before it takes another, so a long-running process (modeld.py) loading
+#model after model does not keep every term it ever parsed
+TERMS = {}
+TERMS_LIMIT = 20000
+
+
+def species_id (raw, compartment_suffix):
+	#species ID for a species as written in an equation, given the '[c] : ' suffix of a single compartment equation ('_c'),
+	#'[' for a multi compartment equation (compartment on each species, 'leu-L[c]'), or '' for an equation without compartments
+	if compartment_suffix == '':
+		species = 'M_' + raw
+	elif compartment_suffix == '[':
+		species = ('M_' + raw[:-3] + '_' + raw[-2:-1]).replace('-', '_DASH_')
+	else:
+		species = ('M_' + raw + compartment_suffix).replace('-', '_DASH_')
+	return intern(species)
+
+
+def parse_term (term, compartment_suffix, numeric, rxnequation):
+	#(species, coefficient) for one term of an equation, e.g. '2 ala-D'; remembered in TERMS
+	tokens = term.split()
+	assert 0 < len(tokens) < 3, "Missing a '+' sign? %s" % rxnequation
+	if len(tokens) == 1:		#only species name is in term, implies stoichiometric coefficient is '1'
+		coefficient, raw = '1', tokens[0]
+	else:						#both stoichiometric coefficient and species name are in term
+		coefficient, raw = tokens
+	if numeric:
+		coefficient = float(coefficient)
+	parsed = (species_id(raw, compartment_suffix), coefficient)
+	terms = TERMS[(compartment_suffix, numeric)]
+	if len(terms) >= TERMS_LIMIT:
+		terms.clear()
+	terms[term] = parsed
+	return parsed
+
+
+def parse_side (text, compartment_suffix, numeric, rxnequation):
+	#[(species, coefficient), ...] for one side of an equation, e.g. '2 ala-D + atp'
+	terms = TERMS.setdefault((compartment_suffix, numeric), {})
+	return [terms.get(term) or parse_term(term, compartment_suffix, numeric, rxnequation) for term in text.split(' + ')]
+
+
+def parse (rxnequation, numeric=False):
+	#one scan for the arrow, then each side is split into terms; reactions written right to left ('<--', '<=') are turned around
+	match = arrow_re.search(rxnequation)
+	assert match, "Mistake in reaction direction arrow. %s" % rxnequation
+	reversibility, backwards = ARROWS[match.group(1)]
+	left, right = rxnequation[:match.start()], rxnequation[match.end():]
+
+	#are compartments included in equation?
+	if '[' in rxnequation:
+		if rxnequation[0] == '[':
+			#reaction is entirely within one compartment: '[c] : ...'
+			compartment_suffix = '_' + rxnequation[1:2]
+			left = left.split(None, 2)[2]
+		else:
+			#reaction in >1 compartments
+			compartment_suffix = '['
+	else:
+		compartment_suffix = ''
+
+	equation = [parse_side(left, compartment_suffix, numeric, rxnequation), parse_side(right, compartment_suffix, numeric, rxnequation)]
+	if backwards:
+		equation.reverse()
+	return reversibility, equation
+
+
+def parse_all (rxnequations, numeric=False):
+	#parse a whole column of equations, e.g. every equation of a model; returns [(reversibility, equation), ...] in the same order
+	return [parse(rxnequation, numeric) for rxnequation in rxnequations]
+
+
 #:::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
 
 
 def makestring (eq, rev):
-	#Pretty print the reaction equation
+	#Pretty print the reaction equation; each side is built as a list of terms and joined once
+	#(cb.get_equation keeps the result per reaction, so a model renders each equation once)
 	
 	#from reversibility, assign reaction arrow
 	if bool(rev):
@@ -137,20 +224,21 @@ def makestring (eq, rev):
 		arrow = '-->'
 	
 	#determine whether reaction occurs in single or multiple compartments
-	compartments = {}
+	compartment = None
+	oneCompartment = True
 	for side in eq:
 		for spec, coef in side:
-			compartments[spec[-1]] = 1
-	if len(compartments.keys()) == 1:
-		prefix = '[' + compartments.keys()[0] + '] : '
-		oneCompartment = True
-	else:
-		prefix = ''
-		oneCompartment = False
+			if compartment is None:
+				compartment = spec[-1]
+			elif spec[-1] != compartment:
+				oneCompartment = False
+	pieces = []
+	if compartment is not None and oneCompartment:
+		pieces.append('[' + compartment + '] :')
 		
-	#build string for reaction	
-	stringed_eq = prefix
+	#build string for reaction: reactants, arrow, products (an empty side is left out)
 	for i, side in enumerate(eq):
+		terms = []
 		for spec, coef in side:
 			if oneCompartment:
 				spec = spec[2:-2]
@@ -158,20 +246,23 @@ def makestring (eq, rev):
 				spec = spec[2:-2] + '[' + spec[-1] + ']'
 			if '_DASH_' in spec:
 				spec = spec.replace('_DASH_', '-')
+			#coefficients may be numbers (e.g., from the model's reaction records) rather than strings
+			if not isinstance(coef, basestring):
+				coef = '%.12g' % coef
 			#take off useless trailing '.0' (i.e., '2.0' -> '2')
 			if coef[-2:] == '.0':
 				coef = coef[:-2]
-			if coef == '1' or coef == '1.0':
-				stringed_eq = stringed_eq + spec + ' + '
+			if coef == '1':
+				terms.append(spec)
 			else:
-				stringed_eq = stringed_eq + coef + ' ' + spec + ' + '
-		#if this is reactant side, place arrow after all reactants added to string
+				terms.append(coef + ' ' + spec)
+		if terms:
+			pieces.append((' + ').join(terms))
+		#if this is reactant side, place arrow after all reactants
 		if i == 0:
-			stringed_eq = stringed_eq[:-3] + ' ' + arrow + ' '
-	#chop off last ' + ' placed at end of equation
-	stringed_eq = stringed_eq[:-3]
+			pieces.append(arrow)
 
-	return stringed_eq
+	return (' ').join(pieces)
 
 #:::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
 	
@@ -0,0 +1,130 @@
+#script purpose: columnar flux store for metmodelCLI.cb.solve(store=...): the flux vectors of many solves in one binary file, reaction metadata written once
+	#uses only standard Python modules
+
+"""
+<store> -> 8 byte floats (native byte order), one block of len(reactions) values per scenario (solve), in the order of <store>.reactions
+	(the layout of a sample file of sampling.py: block k is scenario k, so sampling.samples reads a store too)
+<store>.reactions -> the reactionIDs indexing every block, one per line
+<store>.metadata -> tab separated, one line per reaction: reactionID, name, reversible, subsystem, EC, equation; written once, when the store is made
+<store>.scenarios -> tab separated, one line per block: label, status, objective value; appended with each block
+
+Appending a scenario writes one block and one index line: no equation strings, pathway / EC grouping, sorting or formatting
+of flux values, as list_reactions does for solve(out=...). Fluxes of reactions the solve did not report are nan.
+"""
+
+import os						#standard Python module
+from array import array			#standard Python module
+import sampling					#custom Python module
+
+
+def index_reactions (model):
+	#reactions a store of this model is indexed by: the reaction index of its matrix (the full one if the model is compressed)
+	if model.COMPRESSION:
+		return list(model.COMPRESSION.full.reactions)
+	return list(model.S.reactions)
+
+
+def clean_label (label):
+	#labels are fields of a tab separated line
+	return str(label).replace('\t', ' ').replace('\n', ' ')
+
+
+class writer:
+	"Appends the flux vectors of solves to a store: append(model, label) after each solve. A new store takes its reactions and metadata from 'model'."
+
+	def __init__ (self, filename, model, append=False):
+		#start a new store (replacing one of that name), or with append=True add to an existing one made for the same reactions
+		self.filename = filename
+		if append and os.path.exists(filename + '.scenarios'):
+			self.reactions = [line.strip() for line in open(filename + '.reactions') if line.strip()]
+			if self.reactions != index_reactions(model):
+				raise ValueError('%s holds other reactions than the model has' % (filename))
+			self.count = len([line for line in open(filename + '.scenarios') if line.strip()])
+			self.datafile = open(filename, 'r+b')
+			#drop a block left half written (its index line comes after it)
+			self.datafile.truncate(self.count * 8 * len(self.reactions))
+			self.datafile.seek(0, 2)
+			self.indexfile = open(filename + '.scenarios', 'a')
+		else:
+			self.reactions = index_reactions(model)
+			self.count = 0
+			listfile = open(filename + '.reactions', 'w')
+			for r in self.reactions:
+				print >>listfile, r
+			listfile.close()
+			write_metadata(filename + '.metadata', model, self.reactions)
+			self.datafile = open(filename, 'wb')
+			self.indexfile = open(filename + '.scenarios', 'w')
+		self.reaction2index = dict([(r, j) for j, r in enumerate(self.reactions)])
+
+
+	def append (self, model, label=None):
+		"Add the last solution of 'model' (REACTION2FLUXVALUE, STATUS, OBJECTIVE_VALUE) as a scenario; label defaults to its number. Returns its number."
+		fluxes = model.REACTION2FLUXVALUE
+		block = array('d', [float(fluxes.get(r, 'nan')) for r in self.reactions])
+		block.tofile(self.datafile)
+		self.datafile.flush()
+		if label is None:
+			label = self.count
+		objectivevalue = model.OBJECTIVE_VALUE
+		if objectivevalue == '':
+			objectivevalue = 'nan'
+		self.indexfile.write('%s\t%s\t%r\n' % (clean_label(label), model.STATUS or 'UNDEFINED', float(objectivevalue)))
+		self.indexfile.flush()
+		self.count += 1
+		return self.count - 1
+
+
+	def close (self):
+		self.datafile.close()
+		self.indexfile.close()
+
+
+def write_metadata (filename, model, reactions):
+	#reactionID, name, reversible, subsystem, EC, equation per reaction, tab separated (reactions no longer in the model get '.')
+	outfile = open(filename, 'w')
+	for r in reactions:
+		if not r in model.REACTIONS:
+			print >>outfile, ('\t').join((r, '.', '.', '.', '.', '.'))
+			continue
+		name, reversible, notes, equation = model.REACTIONS[r]
+		print >>outfile, ('\t').join((r, name, str(reversible), model.get_notes(r, 'SUBSYSTEM: '), model.get_notes(r, 'EC: '), model.get_equation(r)))
+	outfile.close()
+
+
+class store (sampling.samples):
+	"""
+	A flux store read through a memory map: store[k] is the flux vector of scenario k (an array aligned to store.reactions),
+	store.column(reactionID) one reaction's flux across scenarios; labels, status and objective hold each scenario's index line.
+	Scenarios appended after the store is opened are not seen.
+	"""
+
+	def __init__ (self, filename):
+		sampling.samples.__init__(self, filename)
+		self.labels, self.status, self.objective = [], [], array('d')
+		for line in open(filename + '.scenarios'):
+			if line.strip():
+				label, status, objectivevalue = line.rstrip('\n').split('\t')
+				self.labels.append(label)
+				self.status.append(status)
+				self.objective.append(float(objectivevalue))
+		#a block being written when the store was opened has no index line yet
+		self.count = min(len(self.labels), sampling.samples.__len__(self))
+
+
+	def __len__ (self):
+		return self.count
+
+
+	def find (self, label):
+		"Number of the (first) scenario with this label."
+		return self.labels.index(clean_label(label))
+
+
+	def metadata (self):
+		"{ reactionID : (name, reversible, subsystem, EC, equation) } from <store>.metadata."
+		table = {}
+		for line in open(self.filename + '.metadata'):
+			col = line.rstrip('\n').split('\t')
+			table[col[0]] = tuple(col[1:])
+		return table
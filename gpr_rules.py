@@ -0,0 +1,182 @@
+#script purpose: compiled gene-protein-reaction (GPR) rules for metmodelCLI.cb
+	#each rule is parsed once into OR-of-AND form over gene bits, so knockouts are evaluated without eval()
+	#uses only standard Python
+
+"""
+data structures in a ruleset:
+
+genes -> [ geneID, ... ]					index in this list = bit of the gene in every mask
+gene2bit -> { geneID : 1 << index }
+reactions -> [ reactionID, ... ]			reactions with a rule, in the order their rules were added
+reaction2index -> { reactionID : index in reactions }
+rules -> { reactionID : ( clausemask, ... ) }		the rule as an OR of clauses; each clause mask is the AND of its genes
+gene2reactions -> { geneID : ( reactionID, ... ) }	reactions whose rule mentions the gene
+
+Rules and index entries are tuples, replaced rather than changed, so copies of a ruleset (copy.deepcopy) share them.
+
+A reaction is lost when every one of its clauses has at least one gene switched off.
+
+pack() gives a ruleset as plain values (for the compiled model cache); unpack() makes it again.
+"""
+
+OPERATORS = {'and':'and', 'or':'or'}
+
+
+def tokenize (rule, comma='or'):
+	#split a rule into '(', ')', 'and', 'or' and gene tokens; a comma separated gene list ('SSA_0981,SSA_0980') reads as 'comma'
+	for symbol in '(),':
+		rule = rule.replace(symbol, ' ' + symbol + ' ')
+	tokens = []
+	for token in rule.split():
+		if token == ',':
+			token = comma
+		elif token.lower() in OPERATORS:
+			token = OPERATORS[token.lower()]
+		tokens.append(token)
+	return tokens
+
+
+def absorb (clauses):
+	#drop repeated clauses and clauses that contain another clause (x or (x and y) == x)
+	kept = []
+	for clause in sorted(dict.fromkeys(clauses), key=lambda mask: bin(mask).count('1')):
+		for smaller in kept:
+			if clause & smaller == smaller:
+				break
+		else:
+			kept.append(clause)
+	return kept
+
+
+class ruleset:
+	"GPR rules of a model compiled to bitmask clauses, with a gene -> reactions index."
+
+	def __init__ (self, comma='or'):
+		#comma: how a comma separated gene list is read, 'or' (isozymes, the default) or 'and' (subunits of a complex)
+		self.comma = comma
+		self.genes = []
+		self.gene2bit = {}
+		self.reactions = []
+		self.reaction2index = {}
+		self.rules = {}
+		self.gene2reactions = {}
+
+
+	def pack (self):
+		#{ attribute : plain value }: every attribute already is one (lists, dictionaries, tuples, strings, integers)
+		return {'comma':self.comma, 'genes':self.genes, 'gene2bit':self.gene2bit, 'reactions':self.reactions,
+				'reaction2index':self.reaction2index, 'rules':self.rules, 'gene2reactions':self.gene2reactions}
+
+
+	def bit (self, gene):
+		#bit of a gene, giving it the next one if this is the first time it is seen
+		if not gene in self.gene2bit:
+			self.gene2bit[gene] = 1 << len(self.genes)
+			self.genes.append(gene)
+			self.gene2reactions[gene] = ()
+		return self.gene2bit[gene]
+
+
+	def parse (self, rule):
+		"Parse a rule ('a and (b or c)', 'a,b', ...) into a list of clause masks. Raises ValueError if it is malformed."
+		tokens = tokenize(rule, self.comma)
+		clauses, position = self.expression(tokens, 0)
+		if position != len(tokens):
+			raise ValueError('unexpected %r in gpr %r' % (tokens[position], rule))
+		return clauses
+
+
+	def expression (self, tokens, position):
+		#expression := term ('or' term)*
+		clauses, position = self.term(tokens, position)
+		while position < len(tokens) and tokens[position] == 'or':
+			more, position = self.term(tokens, position + 1)
+			clauses = absorb(clauses + more)
+		return clauses, position
+
+
+	def term (self, tokens, position):
+		#term := factor ('and' factor)*; distributes the and over the clauses of each factor
+		clauses, position = self.factor(tokens, position)
+		while position < len(tokens) and tokens[position] == 'and':
+			more, position = self.factor(tokens, position + 1)
+			clauses = absorb([left | right for left in clauses for right in more])
+		return clauses, position
+
+
+	def factor (self, tokens, position):
+		#factor := '(' expression ')' | gene
+		if position >= len(tokens):
+			raise ValueError('gpr ends too soon: %r' % (' '.join(tokens)))
+		token = tokens[position]
+		if token == '(':
+			clauses, position = self.expression(tokens, position + 1)
+			if position >= len(tokens) or tokens[position] != ')':
+				raise ValueError('unbalanced parentheses in gpr %r' % (' '.join(tokens)))
+			return clauses, position + 1
+		if token in (')', 'and', 'or'):
+			raise ValueError('unexpected %r in gpr %r' % (token, ' '.join(tokens)))
+		return [self.bit(token)], position + 1
+
+
+	def add (self, reaction, rule):
+		"Compile the rule for a reaction (replacing any earlier rule). Returns the genes it mentions."
+		clauses = self.parse(rule)
+		if reaction in self.rules:
+			for gene in self.genes_of(reaction):
+				self.gene2reactions[gene] = tuple([r for r in self.gene2reactions[gene] if r != reaction])
+		else:
+			self.reaction2index[reaction] = len(self.reactions)
+			self.reactions.append(reaction)
+		self.rules[reaction] = tuple(clauses)
+		genes = self.genes_of(reaction)
+		for gene in genes:
+			self.gene2reactions[gene] += (reaction,)
+		return genes
+
+
+	def genes_of (self, reaction):
+		"Genes mentioned in the rule of a reaction."
+		mask = 0
+		for clause in self.rules.get(reaction, []):
+			mask |= clause
+		genes = []
+		while mask:
+			low = mask & -mask
+			genes.append(self.genes[low.bit_length() - 1])
+			mask ^= low
+		return genes
+
+
+	def mask (self, genes):
+		"Bitmask of the given genes; genes without a rule are ignored."
+		mask = 0
+		for gene in genes:
+			mask |= self.gene2bit.get(gene, 0)
+		return mask
+
+
+	def lost (self, genes_off):
+		"Reactions whose rule is false with the given genes switched off (all other genes on), in rule order."
+		genes_off = list(genes_off)
+		off = self.mask(genes_off)
+		candidates = {}
+		for gene in genes_off:
+			for reaction in self.gene2reactions.get(gene, ()):
+				candidates[reaction] = 1
+		lost = []
+		for reaction in sorted(candidates, key=self.reaction2index.get):
+			for clause in self.rules[reaction]:
+				if not clause & off:
+					break
+			else:
+				lost.append(reaction)
+		return lost
+
+
+def unpack (packed):
+	"The ruleset a pack() gave."
+	rules = ruleset(packed['comma'])
+	rules.genes, rules.gene2bit, rules.reactions = packed['genes'], packed['gene2bit'], packed['reactions']
+	rules.reaction2index, rules.rules, rules.gene2reactions = packed['reaction2index'], packed['rules'], packed['gene2reactions']
+	return rules
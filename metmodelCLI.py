@@ -2,8 +2,15 @@
 #cb is class for constraint-based models 
 	#uses Python 2.4.2 with standard libraries
 	#works with Python 2.7.10, again with standard libraries
-	#requires: glpsol (from glpk, https://www.gnu.org/software/glpk/)
+	#requires: glpk (https://www.gnu.org/software/glpk/); either the shared library (solved in-process) or the glpsol executable
+	#also uses solvers.py module, which holds the LP backends ('glpk' in-process, 'glpsol' subprocess)
+	#also uses stoich.py module, the compiled sparse stoichiometric matrix (self.S) that the backends and writers read
+	#also uses records.py module, the compact (immutable) reaction and species records held in REACTIONS and SPECIES
 	#also uses eq_current.py module, written to deal with parsing reaction equations, metabolites, compartments, etc.
+	#also uses gpr_rules.py module, which compiles the boolean GPR statements read by gpr2 (self.GPR) for knockout evaluation
+	#also uses compression.py module, which removes blocked reactions and lumps linear chains for cb.compress
+	#also uses sampling.py module, the flux sampling chains (ACHR) for cb.sample and the memory-mapped sample files they write
+	#also uses fluxstore.py module, the columnar binary files solve(store=...) appends flux vectors to
 	#this version omits mapGPR.py module, 
 	#   written to read / parse / evaluate boolean GPR statements, etc.
 
@@ -17,16 +24,30 @@ modelname = modelname (string)
 compartments -> { compartmentname : {id:compartmentname, outside:outsidecompartment(None)}, ... }
 
 species -> { speciesid : {id:speciesid, name:speciesname, charge:speciescharge, compartment:speciescompartment, boundarycondition:speciesBC}, ... }
+	(records.species: read like a dictionary, but immutable; add_species replaces it)
 
 reactions -> { reactionid: ( name, rev, {<notes>}, [[(r1, coef1), (r2, coef2), ... ], [(p1, coef1), (p2, coef2)]] ), ... }
+	(records.reaction: unpacks like this tuple, coefficients as written, but is immutable and the notes it unpacks to are read-only; add_note / delete_note replace it)
+
+S -> stoich.smatrix: the same reactions compiled into a sparse matrix with float coefficients, index maps and bound vectors;
+	updated as reactions are added / deleted and constraints set, so solving never re-derives it from reactions
+	(after compress, S is the compressed matrix and the full one is kept in COMPRESSION.full; see compression.py)
 
 NOTES:
 1. currently, reversibility is determined by parsing rxnequation when reading tab-delimited input files,
 	i.e., the column 'REVERSIBILITY' is ignored. Might eventually change this, perhaps eliminate column from input, or use as a check.
 """
 
-import os, re, time, pickle		#standard Python modules
+import os, re, gc, sys, time, copy, errno, random, pickle, marshal, hashlib, multiprocessing		#standard Python modules
+from array import array				#standard Python module
 import eq_current				#custom Python module
+import solvers					#custom Python module
+import stoich					#custom Python module
+import gpr_rules				#custom Python module
+import records					#custom Python module
+import compression				#custom Python module
+import sampling					#custom Python module
+import fluxstore				#custom Python module
 
 
 #regular expression to capture ec numbers
@@ -37,6 +58,15 @@ DISCREPANCIES = {'R_DHFS':1, 'R_DHPS2':1, 'R_MTHFR2':1, 'R_MTHFR3':1, 'R_METS':1
 				'R_MTHFCm':1, 'R_GTPCI':1, 'R_MTHFD':1, 'R_MTHFC':1, 'R_MTHFD2':1, 
 				'R_MTHFDm':1, 'R_QULNS':1}
 
+#compiled model caches (see cb.save_cache): file tag and format version; bump the version whenever the model data structures change.
+#a cache holds only plain values (written with marshal, which never runs code when reading), with arrays as bytes in this machine's layout
+CACHE_MAGIC = 'metmodelCLI compiled model'
+CACHE_VERSION = 9
+CACHE_LAYOUT = (sys.byteorder, array('i').itemsize, array('d').itemsize)
+#what a cache holds: the attributes a model file fills in (built with default settings, so nothing set on an instance beforehand is cached)
+MODEL_DATA = ('COMPARTMENTS', 'SPECIES', 'REACTIONS', 'EXCHANGES', 'CONSTRAINTS', 'GENES', 'TRANSCR', 'PROTS', 'REACTS', 'COMPLEXES',
+				'ISOZYMES', 'PROTEIN2GENE', 'SIMPLEGPR', 'GPR', 'S')
+
 #dictionary mapping one letter abbreviation used as suffix on species ID to corresponding compartment				
 abbrev2compartment = {
 						'c':('Cytosol', 'Extraorganism'),
@@ -57,9 +87,12 @@ abbrev2compartment = {
 											}
 											
 def derive_coef (original_raw):
-	#Given coeficient from eq data structure, derive the coeficient to be used in the *.lp file
+	#Given coeficient from eq data structure (string) or from S (float), derive the coeficient to be used in the *.lp file
 	coef = ' '
-	raw = str(original_raw)
+	if type(original_raw) == type(1.0):
+		raw = '%.12g' % original_raw
+	else:
+		raw = str(original_raw)
 	if raw[0] == '-':
 		integ = raw[1:]
 		if integ == '1':
@@ -74,6 +107,40 @@ def derive_coef (original_raw):
 			coef = coef + '+' + integ
 	return coef
 											
+def open_source (source):
+	#input files may be given as filenames or as open file objects / in-memory buffers (anything with readline)
+	if hasattr(source, 'readline'):
+		return source
+	return open(source)
+
+
+def source_name (source):
+	#name of an input for messages: the filename, or the file object's name if it has one
+	if hasattr(source, 'readline'):
+		return getattr(source, 'name', '<stream>')
+	return source
+
+
+def pack_model_data (data):
+	#model_data as plain values (dictionaries, lists, tuples, strings, numbers) for the compiled model cache
+	packed = dict(data)
+	packed['SPECIES'] = records.pack_species(data['SPECIES'])
+	packed['REACTIONS'] = records.pack_reactions(data['REACTIONS'])
+	packed['GPR'] = data['GPR'].pack()
+	packed['S'] = data['S'].pack()
+	return packed
+
+
+def unpack_model_data (packed):
+	#model_data again from pack_model_data's values
+	data = dict([(key, packed[key]) for key in MODEL_DATA + ('VMAX',)])
+	data['SPECIES'] = records.unpack_species(packed['SPECIES'])
+	data['REACTIONS'] = records.unpack_reactions(packed['REACTIONS'])
+	data['GPR'] = gpr_rules.unpack(packed['GPR'])
+	data['S'] = stoich.unpack(packed['S'])
+	return data
+
+
 def ensure_boolean (id, val):
 	#ensure that boundaryCondition is a boolean value
 	if type(val) == type(True):
@@ -85,8 +152,122 @@ def ensure_boolean (id, val):
 		elif 'alse' in val:
 			boolvar = False
 		return boolvar
+
+
+def output_stem (out):
+	#'out.<timestamp>' for solve's output files, or 'out.<timestamp>.1', ... if that is taken: the stem is claimed by creating its *.lp
+	#file exclusively, so solves writing to the same 'out' in the same second (other threads, processes or users) get files of their own
+	stem = out + '.' + time.strftime("%Y_%m_%d_%H_%M_%S")
+	for n in range(1000):
+		name = stem
+		if n:
+			name = stem + '.' + str(n)
+		try:
+			os.close(os.open(name + '.lp', os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0666))
+			return name
+		except OSError, error:
+			if error.errno != errno.EEXIST:
+				raise
+	raise IOError('no free output filenames for %s' % (stem))
 		
 
+#::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+#process pools for scans (deletions, ...): every worker process holds its own copy of the model, with its own solver session
+
+WORKER = {}
+
+def init_worker (model, function):
+	#pool initializer: keep this worker's model copy and the function to apply to each task
+	WORKER['model'], WORKER['function'] = model, function
+
+
+def run_worker (task):
+	return WORKER['function'](WORKER['model'], task)
+
+
+def run_parallel (model, function, tasks, workers=1):
+	#apply function(model, task) to every task, split across 'workers' processes (None = one per core); results come back in task order
+	if workers is None:
+		workers = multiprocessing.cpu_count()
+	if workers <= 1 or len(tasks) <= 1:
+		return [function(model, task) for task in tasks]
+	pool = multiprocessing.Pool(min(workers, len(tasks)), init_worker, (model, function))
+	try:
+		results = pool.map(run_worker, tasks, max(1, len(tasks) // (4 * workers)))
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	pool.join()
+	return results
+
+
+def knockout_task (model, reactions):
+	#worker task for deletion scans: objective with the given reactions knocked out
+	return model.knockout(reactions)
+
+
+def knockout_support_task (model, reactions):
+	#worker task for deletion scans: as knockout_task, plus the reactions carrying flux in the knockout's solution
+	status, objectivevalue = model.knockout(reactions)
+	return status, objectivevalue, model.flux_support()
+
+
+def fva_task (model, reaction):
+	#worker task for flux variability: minimum and maximum flux through one reaction, each solve starting from the last basis
+	return model.flux_range(reaction)
+
+
+def envelope_task (model, task):
+	#worker task for production envelopes: range of flux through y with x fixed at each value of a block of neighboring grid points
+	x, y, values = task
+	ranges = []
+	for value in values:
+		model.set_constraint(x, repr(value), repr(value))
+		ranges.append(model.flux_range(y))
+	return ranges
+
+
+def phase_plane_task (model, task):
+	#worker task for phase planes: objective value with x and y fixed at each point of a block of neighboring grid points (nan if not OPTIMAL)
+	x, y, objective, points = task
+	model.set_objective(objective[0], objective[1])
+	values = []
+	for xvalue, yvalue in points:
+		model.set_constraint(x, repr(xvalue), repr(xvalue))
+		model.set_constraint(y, repr(yvalue), repr(yvalue))
+		model.solve(verbose=False, duals=False)
+		if model.STATUS == 'OPTIMAL':
+			values.append(float(model.OBJECTIVE_VALUE))
+		else:
+			values.append(float('nan'))
+	return values
+
+
+def grid (low, high, points):
+	#'points' evenly spaced values from low to high (both included)
+	if points <= 1:
+		return array('d', [low])
+	return array('d', [low + (high - low) * i / (points - 1) for i in range(points)])
+
+
+def blocks (sequence, count):
+	#split a sequence into 'count' contiguous blocks (fewer if it is short), so each worker solves neighboring grid points one after another
+	count = max(1, min(count, len(sequence)))
+	size, extra = divmod(len(sequence), count)
+	result, first = [], 0
+	for i in range(count):
+		last = first + size + int(i < extra)
+		result.append(sequence[first:last])
+		first = last
+	return result
+
+
+def sample_task (model, task):
+	#worker task for flux sampling: one ACHR chain, writing its rows of the sample file (task holds sampling.chain's arguments)
+	return sampling.chain(*task)
+	
+
 #::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
 
 class cb:
@@ -114,6 +295,9 @@ class cb:
 		self.GENES, self.TRANSCR, self.PROTS, self.REACTS, self.COMPLEXES, self.ISOZYMES =	{}, {}, {}, {}, {}, {}
 		self.PROTEIN2GENE = {}
 		self.SIMPLEGPR = {}
+		#the gprs in SIMPLEGPR compiled to bitmask rules (see gpr_rules.py); comma separated gene lists read as 'or'
+		#unless the model is built with gpr_comma='and' (see set_gpr_comma)
+		self.GPR = gpr_rules.ruleset(comma='or')
 
 				
 		#default max/min value for fluxes
@@ -122,11 +306,50 @@ class cb:
 		#holds user-specified reaction flux constraints
 		self.CONSTRAINTS = {}
 		
+		#compiled stoichiometric matrix and bound vectors (see stoich.py)
+		self.S = stoich.smatrix()
+		
 		self.OBJECTIVE = ('Maximize', 'R_biomass')
 		self.STATUS = ''
 		self.OBJECTIVE_VALUE = ''
 		self.REACTION2FLUXVALUE = {}
+		#duals of the last solution: reduced cost of each reaction (column) and shadow price of each mass balanced species (row)
+		self.REACTION2REDUCEDCOST = {}
+		self.SPECIES2SHADOWPRICE = {}
 		self.MINBIOMASS = '0.001'			
+		
+		#LP backend used by 'solve' (see solvers.py)
+		self.SOLVER = solvers.default_backend()
+		#persistent in-process solver session (solvers.glpk_session), created by the first 'glpk' solve
+		self.SESSION = None
+		#bumped whenever reactions are added or deleted, so the session knows to rebuild
+		self.REVISION = 0
+		#reactionIDs whose bounds changed since the session last solved
+		self.CHANGED_BOUNDS = {}
+		#optional store of recent solve results (solvers.solution_cache), off unless turned on with set_solve_cache
+		self.SOLVE_CACHE = None
+		#optional solve timings and counters (solvers.solve_stats), off unless turned on with set_stats
+		self.STATS = None
+		#mapping to the compressed stoichiometric matrix (compression.compression), set by compress
+		self.COMPRESSION = None
+		#equation strings rendered by get_equation: { reactionID : (reaction record, string) }, dropped when the reaction is added / deleted
+		self.EQUATIONS = {}
+				
+	
+	def copy (self):
+		"Independent copy of the model (e.g., for a strain variant); reaction and species records are immutable, so the copy shares them."
+		return copy.deepcopy(self)
+
+
+	def __getstate__ (self):
+		#the solver session wraps a GLPK pointer; copies / pickles of the model start without one
+		#(and without solve stats, whose callback may not pickle)
+		state = self.__dict__.copy()
+		state['SESSION'] = None
+		state['STATS'] = None
+		#(rendered equations are cheap to redo, so they are left out of caches and copies)
+		state['EQUATIONS'] = {}
+		return state
 				
 								
 	def set_id (self, ID):
@@ -147,21 +370,32 @@ class cb:
 	def delete_reaction (self, id):
 		"Given a reactionID, delete this key, value pair from REACTIONS. Does not delete reaction species from SPECIES."
 		if id in self.REACTIONS:
+			cb.uncompress(self)
 			del self.REACTIONS[id]
+			self.EQUATIONS.pop(id, None)
+			self.S.delete_reaction(id)
+			self.REVISION += 1
+			if self.SOLVE_CACHE:
+				self.SOLVE_CACHE.clear()
 		else:
 			print 'WARNING--cannot delete %s: not in REACTIONS' % (id)
 			
 	
 	def get_equation (self, id):
-		"Given a reactionID, prettyprint the reaction equation."
-		name, reversible, notes, equation = self.REACTIONS[id]
-		reactionequation = eq_current.makestring(equation, reversible)
+		"Given a reactionID, prettyprint the reaction equation (rendered once per reaction, then kept in EQUATIONS)."
+		record = self.REACTIONS[id]
+		rendered = self.EQUATIONS.get(id)
+		#a reaction record replaced other than through add_reaction (e.g., new notes) is rendered again
+		if rendered and rendered[0] is record:
+			return rendered[1]
+		reactionequation = eq_current.makestring(record.equation(), record.rev)
+		self.EQUATIONS[id] = (record, reactionequation)
 		return reactionequation
 		
 		
 	def add_species (self, id, name, compartment, charge, boundaryCondition):
 		"Write a new species into the species list for the model. Example: m.add_species('M_h2o_c', 'water', 'cytosol', '0', 'False'). Params are ID, name, compartment, charge, boundaryCondition."
-		self.SPECIES[id] = {'id':id, 'name':name, 'compartment':compartment, 'charge':charge, 'boundaryCondition':boundaryCondition}
+		self.SPECIES[id] = records.species(id, name, compartment, charge, boundaryCondition)
 
 
 	def add_compartment (self, id, outside=None):
@@ -175,18 +409,53 @@ class cb:
 		"Given a reaction ID, set lbound and ubound. Example: m.set_constraint('R_UNK2', 0, 1000)."
 		if id in self.REACTIONS:
 			self.CONSTRAINTS[id] = (str(lbound), str(ubound))
+			cb.update_bounds(self, id)
 		else:
 			print 'WARNING--cannot set constraint for %s: not in REACTIONS' % (id)
 	
 	
+	def get_bounds (self, id):
+		"Given a reaction ID, return (lbound, ubound) in effect: the user-specified constraint, or defaults from VMAX and reversibility."
+		if id in self.CONSTRAINTS:
+			return self.CONSTRAINTS[id]
+		if bool(self.REACTIONS[id].rev):
+			return ('-' + self.VMAX, self.VMAX)
+		return ('0', self.VMAX)
+	
+	
 	def unset_constraint (self, id):
 		"Given a reaction ID, reset lbound and ubound to defaults. Example: m.unset_constraint('R_UNK2')."
 		if id in self.REACTIONS and id in self.CONSTRAINTS:
 			del self.CONSTRAINTS[id]
+			cb.update_bounds(self, id)
 		elif not id in self.REACTIONS:
 			print 'WARNING--cannot unset constraint for %s: not in REACTIONS' % (id)
 	
 	
+	def update_bounds (self, id):
+		#push the bounds in effect for a reaction into S (into its column, if the model is compressed)
+		lbound, ubound = cb.get_bounds(self, id)
+		if not self.COMPRESSION:
+			self.S.set_bounds(id, lbound, ubound)
+			self.CHANGED_BOUNDS[id] = 1
+			return
+		self.COMPRESSION.full.set_bounds(id, lbound, ubound)
+		if self.COMPRESSION.widens(id, float(lbound), float(ubound)):
+			print 'WARNING--%s can now carry flux in a direction it could not when the model was compressed; uncompressing' % (id)
+			cb.uncompress(self)
+			return
+		if id in self.COMPRESSION.removed:
+			return
+		column = self.COMPRESSION.column[id][0]
+		bounds = compression.lump_bounds([(factor,) + self.COMPRESSION.full.bounds(r) for r, factor in self.COMPRESSION.members[column]])
+		if bounds is None:
+			print 'WARNING--bounds on %s leave no feasible flux through its lump %s; uncompressing' % (id, column)
+			cb.uncompress(self)
+			return
+		self.S.set_bounds(column, bounds[0], bounds[1])
+		self.CHANGED_BOUNDS[column] = 1
+
+
 	def print_constraints (self):
 		"Print all constraints."
 		orderedc = self.CONSTRAINTS.keys()
@@ -206,6 +475,9 @@ class cb:
 				ubound = newvalue_str
 			self.CONSTRAINTS[constraint] = (lbound, ubound)
 		self.VMAX = newvalue_str
+		#defaults changed for every reaction
+		for id in self.REACTIONS:
+			cb.update_bounds(self, id)
 				
 				
 	def	add_note (self, ID, notetext):
@@ -214,9 +486,9 @@ class cb:
 			pass
 			#print 'WARNING--cannot add "%s" to notes for %s: %s not in REACTIONS' % (notetext, ID, ID)
 		else:	
-			name, rev, notes, eq = self.REACTIONS[ID]
-			notes[notetext] = 1
-			self.REACTIONS[ID] = (name, rev, notes, eq)
+			record = self.REACTIONS[ID]
+			if not notetext in record.notes:
+				self.REACTIONS[ID] = record.with_notes(record.notes + (notetext,))
 
 
 	def	delete_note (self, ID, notetext):
@@ -224,10 +496,9 @@ class cb:
 		if not ID in self.REACTIONS:
 			print 'WARNING--cannot delete "%s" from notes of %s: %s not in REACTIONS' % (notetext, ID, ID)
 		else:	
-			name, rev, notes, eq = self.REACTIONS[ID]
-			if notetext in notes:
-				del notes[notetext]
-				self.REACTIONS[ID] = (name, rev, notes, eq)
+			record = self.REACTIONS[ID]
+			if notetext in record.notes:
+				self.REACTIONS[ID] = record.with_notes([note for note in record.notes if note != notetext])
 			else:
 				print 'WARNING--cannot delete "%s" from notes of %s: %s not in notes' % (notetext, ID, notetext)
 
@@ -235,8 +506,7 @@ class cb:
 	def get_notes (self, reaction, tagstring):
 		"Get specific categories of information from notes; categories are indicated by tagstring, e.g., 'SUBSYSTEM: ' for pathway info."
 		results = {}
-		name, rev, notes, eq = self.REACTIONS[reaction]
-		for note in notes:
+		for note in self.REACTIONS[reaction].notes:
 			if tagstring in note:
 				results[note[len(tagstring):]] = 1
 		if results == {}:
@@ -249,7 +519,14 @@ class cb:
 		if ID in self.REACTIONS:
 			print ID, 'already in REACTIONS'
 		else:
-			self.REACTIONS[ID] = (name, rev, notes, equation)
+			cb.uncompress(self)
+			self.REACTIONS[ID] = records.reaction(name, rev, notes, equation)
+			self.EQUATIONS.pop(ID, None)
+			lbound, ubound = cb.get_bounds(self, ID)
+			self.S.add_reaction(ID, equation, lbound, ubound)
+			self.REVISION += 1
+			if self.SOLVE_CACHE:
+				self.SOLVE_CACHE.clear()
 			if ID in DISCREPANCIES:
 				warning_equation = eq_current.makestring(equation, rev)
 				#print ID, 'discrepant across models. Using:', warning_equation
@@ -265,44 +542,9 @@ class cb:
 				
 
 	def write_lp (self, lpfilename):
-		"Write current model in *.lp file format. Provide a name for the file. Automatically called by 'solve' method."
+		"Write current model in *.lp file format. Provide a name for the file. Automatically called by 'solve' method. Returns the row (constraint) and column (variable) names, in the order glpsol numbers them."
 		outfile = open(lpfilename, 'w')
-		
-		mets = {}
-		constraints = {}
-
-		for ID in self.REACTIONS:
-			
-			name, reversible, notes, equation = self.REACTIONS[ID]
-						
-			#if there have been specific constraints already set, use them...
-			if ID in self.CONSTRAINTS:
-				lbound, ubound = self.CONSTRAINTS[ID]
-			#otherwise create constraints on the fly, using reaction reversibility and self.VMAX...
-			else:
-				ubound = self.VMAX
-				if bool(reversible):
-					lbound = '-' + self.VMAX
-				else:
-					lbound = '0'
-			constraints[lbound + ' <= ' + ID + ' <= ' + ubound] = 1
-				
-			#create a data structure called 'mets': keys are metabolites, values are (reactionID, coef); this is essentially "S * v"
-			for reactant in equation[0]:
-				species, coef = reactant[0], '-' + str(reactant[1])
-				if '_b' == species[-2:]:
-					continue
-				if not species in mets:
-					mets[species] = []
-				mets[species].append((ID, coef))
-				
-			for product in equation[1]:
-				species, coef = product[0], product[1]
-				if '_b' == species[-2:]:
-					continue
-				if not species in mets:
-					mets[species] = []
-				mets[species].append((ID, coef))
+		S = self.S
 
 		#:::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
 		#WRITE *.LP FILE....
@@ -320,19 +562,28 @@ class cb:
 		print >>outfile, self.OBJECTIVE[0]
 		print >>outfile, '  Z : ' + self.OBJECTIVE[1]
 		print >>outfile, '\n'
+		#variables are numbered in order of first appearance: the objective, then the mass balances, then the bounds
+		rownames, colnames, seen = [], [self.OBJECTIVE[1]], {self.OBJECTIVE[1]:1}
 				
 		#print out 'Subject To' part of .lp file
 		print >>outfile, '\\\ Mass balance equations'
 		print >>outfile, 'Subject To'		
 
-		for m in mets:
-			fcs = mets[m]
+		#one row of S per (non-boundary) metabolite that takes part in a reaction; this is "S * v = 0"
+		indptr, cols, coefs = S.csr()
+		for i, m in enumerate(S.metabolites):
+			if not S.balanced[i] or indptr[i] == indptr[i + 1]:
+				continue
 			line = '  ' + m + ' :'
+			rownames.append(m)
 			
-			for fc in fcs:
-				flux = fc[0]
-				coef = derive_coef(fc[1])
+			for k in range(indptr[i], indptr[i + 1]):
+				flux = S.reactions[cols[k]]
+				coef = derive_coef(coefs[k])
 				line = line + coef + ' ' + flux
+				if not flux in seen:
+					seen[flux] = 1
+					colnames.append(flux)
 			line = line + ' = 0'
 			print >>outfile, line
 
@@ -342,99 +593,189 @@ class cb:
 		print >>outfile, 'Bounds'
 		print >>outfile, '\n'
 
-		for c in constraints:
-			print >>outfile, '  ' + c
+		for j, ID in enumerate(S.reactions):
+			print >>outfile, '  ' + '%.12g' % S.lb[j] + ' <= ' + ID + ' <= ' + '%.12g' % S.ub[j]
+			if not ID in seen:
+				seen[ID] = 1
+				colnames.append(ID)
 
 		#print *.lp file suffix...
 		print >>outfile, '\n'
 		print >>outfile, 'End'
+		outfile.close()
+		return rownames, colnames
+		
+		
+	def set_solver (self, name):
+		"Choose the LP backend used by 'solve': 'glpk' (in-process, needs the GLPK shared library) or 'glpsol' (runs the glpsol executable). Example: m.set_solver('glpsol')."
+		assert name in solvers.BACKENDS, 'Unknown solver %s; choose from %s' % (name, (', ').join(solvers.BACKENDS.keys()))
+		if name == 'glpk':
+			assert solvers.GLPK, 'GLPK shared library not found; use the glpsol backend instead.'
+		self.SOLVER = name
 		
 		
-	def solve (self, out=False, verbose=True):
-		"Run glpsol to see if solution exists. Argument is out=<fn> (if no filename given, just solves without writing output to a file, for checking purposes)."
+	def reset_session (self):
+		"Discard the persistent solver session (and its basis); the next solve rebuilds the LP from scratch."
+		if self.SESSION:
+			self.SESSION.close()
+		self.SESSION = None
+		
+		
+	def compress (self):
+		"""
+		Shrink the LP: remove blocked reactions (dead ends, given the directions the current bounds allow) and lump reactions
+		whose fluxes are coupled through linear chains into one column each. The model's reactions are unchanged; solve expands
+		the column fluxes back into REACTION2FLUXVALUE for every reaction (0 for removed ones), constraints on any reaction
+		apply to its lump, and deletion and fva scans solve one LP per distinct set of columns. Set constraints before
+		compressing: a bound that lets a reaction run in a new direction, or adding / deleting a reaction, uncompresses.
+		Returns {'reactions', 'columns', 'removed', 'lumped'}.
+		"""
+		cb.uncompress(self)
+		self.COMPRESSION = compression.compression(self.S, self.OBJECTIVE[1])
+		self.S = self.COMPRESSION.reduce()
+		self.REVISION += 1
+		if self.SOLVE_CACHE:
+			self.SOLVE_CACHE.clear()
+		return self.COMPRESSION.summary()
+
+
+	def uncompress (self):
+		"Undo compress: back to one LP column per reaction."
+		if not self.COMPRESSION:
+			return
+		self.S = self.COMPRESSION.full
+		self.COMPRESSION = None
+		self.REVISION += 1
+		if self.SOLVE_CACHE:
+			self.SOLVE_CACHE.clear()
+
+
+	def solve (self, out=False, verbose=True, duals=True, store=None, label=None):
+		"Solve the model with the current LP backend (see set_solver). Argument is out=<fn> (if no filename given, just solves without writing output to a file, for checking purposes). duals=False may skip reduced costs / shadow prices. store=<flux store writer> (see flux_store) appends the fluxes to it as scenario 'label' instead of listing them."
 		
 		#if no escapes have been specified, make escapes on all metabolites in the model
 		if self.ESCAPES == [] and self.EXCHANGES == []:
 			print '# No escapes currently specified. Adding escape fluxes to all metabolites in model.'
 			cb.set_escapes(self, self.SPECIES.keys())
 
-		#make timestamp...
-		timestamp = time.strftime("%Y_%m_%d_%H_%M_%S")
-			
 		if out:
-			#set names of outputfiles
-			lpfilename = out + '.' + timestamp + '.lp'
-			rawoutfilename = out + '.' + timestamp + '.out'
-			xlsfilename = out + '.' + timestamp + '.xls'
+			#make timestamp, set names of outputfiles (a name of their own, even if another solve writes to 'out' in the same second)
+			stem = output_stem(out)
+			lpfilename = stem + '.lp'
+			rawoutfilename = stem + '.out'
+			xlsfilename = stem + '.xls'
 			
 		else:
-			#if out not specified, make tmp filenames (these files deleted below in this case)
-			lpfilename = 'tmp.' + timestamp + '.lp'
-			rawoutfilename = 'tmp.' + timestamp + '.out'
-			xlsfilename = 'tmp.' + timestamp + '.xls'
+			#if out not specified, the backend works without keeping any files
+			lpfilename, rawoutfilename = None, None
 			
-		#write the *.lp file
-		cb.write_lp(self, lpfilename)
-
-		#construct glpsol command and execute, following calls glpsol from .lib; original command commented out below
-		#command = '/Users/seth/.lib/python/glpsol --cpxlp ' + lpfilename + ' -o ' + rawoutfilename + ' > glpsol.log'
-		command = 'glpsol --cpxlp ' + lpfilename + ' -o ' + rawoutfilename + ' > glpsol.log'
-		os.system(command)
-		
-		self.REACTION2FLUXVALUE = {}
+		stats = self.STATS
+		if stats:
+			stats.begin()
+
+		#on a compressed model, an objective on a lumped reaction is an objective on its column (scaled by the reaction's factor)
+		objective, factor = self.OBJECTIVE, 1.0
+		if self.COMPRESSION:
+			column, factor = self.COMPRESSION.objective(objective[1])
+			goal = objective[0]
+			if factor < 0:
+				goal = {True:'Minimize', False:'Maximize'}[goal.lower().startswith('max')]
+			self.OBJECTIVE = (goal, column)
+
+		#reuse a stored result for this exact objective and bounds, if the solve cache is on (output files always need a real solve)
+		key, result = None, None
+		if self.SOLVE_CACHE:
+			key = self.SOLVE_CACHE.key(self, duals)
+			if not out:
+				result = self.SOLVE_CACHE.get(key)
+			if stats:
+				stats.lap('cache')
+				if result:
+					stats.count('cache_hits')
+		try:
+			if not result:
+				#build and solve the LP with the selected backend
+				backend = solvers.BACKENDS[self.SOLVER]()
+				result = backend.solve(self, lpfilename, rawoutfilename, duals)
+				if key:
+					self.SOLVE_CACHE.put(key, result)
+				if stats:
+					stats.count('lps_solved')
+		finally:
+			self.OBJECTIVE = objective
+		status, objectivevalue, reaction2fluxvalue, reaction2reducedcost, species2shadowprice = result
+		#callers may edit REACTION2FLUXVALUE, ..., so they never are the stored dictionaries themselves
+		self.STATUS, self.OBJECTIVE_VALUE = status, objectivevalue
+		self.REACTION2FLUXVALUE, self.REACTION2REDUCEDCOST, self.SPECIES2SHADOWPRICE = reaction2fluxvalue.copy(), reaction2reducedcost.copy(), species2shadowprice.copy()
+		if self.COMPRESSION:
+			#fluxes for every reaction of the model; reduced costs only for reactions that are columns on their own
+			if objectivevalue != '':
+				#(adding 0.0 turns the -0.0 of a removed reaction's objective into 0.0)
+				self.OBJECTIVE_VALUE = solvers.format_objective(factor * objectivevalue) + 0.0
+			self.REACTION2FLUXVALUE = self.COMPRESSION.expand(reaction2fluxvalue, solvers.format_flux)
+			for column in reaction2reducedcost:
+				if len(self.COMPRESSION.members.get(column, ())) > 1:
+					del self.REACTION2REDUCEDCOST[column]
 		
-		#read rawoutput file, parse results
-		file = open(rawoutfilename)
-		lines = file.readlines()
-		for i, line in enumerate(lines):
-			if line == '': break
-			line = line.rstrip()
-			if line == '': continue
-			col = line.split()
-			
-			#collects info on whether optimization was OK, and if so, what was the value of the Objective fnc
-			if 'Status:' == line[0:7]:
-				tmp = line.split()
-				self.STATUS = tmp[1]
-			if 'Objective:' == line[0:10]:
-				tmp = line.split()
-				self.OBJECTIVE_VALUE = float(tmp[3])
-				
-			#skipping irrelevant lines	
-			if len(col) > 1:
-				#find lines that have the name of a flux as col[1]
-				if col[1] in self.REACTIONS:
-					if len(col) < 4:
-						nextline = lines[i+1]
-						nextcol = nextline.split()
-						self.REACTION2FLUXVALUE[col[1]] = nextcol[1]
-					else:
-						self.REACTION2FLUXVALUE[col[1]] = col[3]
-							
-		
-		#send results to *.xls file
+		#send results to *.xls file, or the flux store
+		if store:
+			store.append(self, label)
 		if out:
 			cb.list_reactions(self, out=xlsfilename, showfluxvalues=True)
-
-		#if you didn't ask to save the output, delete the tmp output files
-		if not out:
-		
-			if verbose:
-				cb.list_reactions(self, showfluxvalues=True)
-			
-			command1 = 'rm ' + lpfilename
-			command2 = 'rm ' + rawoutfilename
-
-			os.system(command1)
-			os.system(command2)
+		elif verbose and not store:
+			cb.list_reactions(self, showfluxvalues=True)
+		if stats:
+			if out or verbose or store:
+				stats.lap('report')
+			stats.end(self)
 				
 		
+	def flux_store (self, filename, append=False):
+		"Writer of a columnar flux store (fluxstore.py) for this model's reactions: m.solve(store=writer, label=...) adds each solution as one binary block. Read it with fluxstore.store(filename)."
+		return fluxstore.writer(filename, self, append)
+
+
+	def set_stats (self, on=True, callback=None):
+		"Record timings (seconds per phase: cache, build, write, run, parse, cleanup, report) and counters of every solve; read them with m.stats(). callback(last, model) is called after each solve with that solve's timings. on=False turns this off."
+		if on:
+			self.STATS = solvers.solve_stats(callback)
+		else:
+			self.STATS = None
+
+
+	def stats (self):
+		"Solve timings and counters: {'calls', 'last', 'totals', 'counters'} (None if off, see set_stats)."
+		if self.STATS is None:
+			return None
+		return self.STATS.report()
+
+
+	def set_solve_cache (self, size=128):
+		"Keep the results of the last 'size' distinct solves (objective, VMAX and bounds) and return them when the same state is solved again. size=0 turns the cache off."
+		if size:
+			self.SOLVE_CACHE = solvers.solution_cache(size)
+		else:
+			self.SOLVE_CACHE = None
+
+
+	def solve_cache_stats (self):
+		"Hits, misses, entries and size of the solve cache (None if it is off)."
+		if self.SOLVE_CACHE is None:
+			return None
+		return self.SOLVE_CACHE.stats()
+
+
 	def list_reactions (self, out=False, showfluxvalues=True):
 		"Prints a list of reactions from current model, organized by path, then ecnumber. Arguments are out=<fn>, showfluxvalues=<True/False>. Defaults are False, True."
 		cache = {}
 		for reaction in self.REACTIONS:
-			name, reversible, notes, equation = self.REACTIONS[reaction]
-			reactionequation = eq_current.makestring(equation, reversible)
+			#a listing of flux values leaves out reactions without flux, so their notes need no reading
+			if showfluxvalues and self.REACTION2FLUXVALUE.get(reaction, '.') == '0':
+				continue
+			#the record's fields are read directly (unpacking it also rebuilds the equation lists); notes go in the order unpacking gives them
+			record = self.REACTIONS[reaction]
+			name, reversible, notes = record.name, record.rev, dict.fromkeys(record.notes, 1)
+			reactionequation = cb.get_equation(self, reaction)
 			#search for any ec numbers and pathways in reaction notes; it IS possible for there to be > 1 ec or pathway for a given reaction
 			confidence, gpr = '?', '?'
 			holder = {'pathways':{}, 'ecs':{}}
@@ -515,6 +856,8 @@ class cb:
 		for constraint in constraints_holder:
 			(lbound, ubound) = constraints_holder[constraint]
 			self.CONSTRAINTS[constraint] = (lbound, ubound)
+			if constraint in self.REACTIONS:
+				cb.update_bounds(self, constraint)
 			
 										
 	def set_sources (self, sourcelist):
@@ -583,41 +926,46 @@ class cb:
 	def build(self, model_file, readquiet):
 		#read and build initial model (just the reactions specified)
 		if not readquiet:
-			print 'model from', model_file
-		file = open(model_file)
+			print 'model from', source_name(model_file)
+		file = open_source(model_file)
 		while True:
 			line = file.readline()
 			if line == '': break
 			line = line.rstrip()
 			if line == '': continue
 			if line[0] == '#': continue
-			if line[:2] == 'R_' or line[0] == 'R':
-				col = line.split('\t')
-				if 'R_ILL_' in col[0]:
-					continue
-				
-				[id, name, rev, pathwaysstr, ecsstr, stringequation] = col[0:6]
-				
-				reversibility, equation = eq_current.parse(stringequation)
-				
-				notes, pathways, ecs = {}, pathwaysstr.split('; '), ecsstr.split('; ')
-				#if len(pathways) > 1: print id, "associated with > 1 pathways; splitting list on '; '"
-				for pathway in pathways:
-					notes['SUBSYSTEM: ' + pathway] = 1
-				#if len(ecs) > 1: print id, "associated with > 1 ec numbers; splitting list on '; '"
-				for ec in ecs:
-					notes['EC: ' + ec] = 1
-				
-				#check read in of model...		
-				#print stringequation
-				#print '  ', id, name, reversibility, notes, equation
-				
-				cb.add_reaction(self, id, name, reversibility, notes, equation)
-			#insert new code here to handle gpr, notes, refs, etc...
+			cb.read_reaction(self, line)
 		if not readquiet:
 			print
 
 
+	def read_reaction(self, line):
+		#add the reaction on one line of a model file: id, name, rev, pathways, ecs, equation (tab-delimited)
+		if line[:2] == 'R_' or line[0] == 'R':
+			col = line.split('\t')
+			if 'R_ILL_' in col[0]:
+				return
+			
+			[id, name, rev, pathwaysstr, ecsstr, stringequation] = col[0:6]
+			
+			reversibility, equation = eq_current.parse(stringequation)
+			
+			notes, pathways, ecs = {}, pathwaysstr.split('; '), ecsstr.split('; ')
+			#if len(pathways) > 1: print id, "associated with > 1 pathways; splitting list on '; '"
+			for pathway in pathways:
+				notes['SUBSYSTEM: ' + pathway] = 1
+			#if len(ecs) > 1: print id, "associated with > 1 ec numbers; splitting list on '; '"
+			for ec in ecs:
+				notes['EC: ' + ec] = 1
+			
+			#check read in of model...		
+			#print stringequation
+			#print '  ', id, name, reversibility, notes, equation
+			
+			cb.add_reaction(self, id, name, reversibility, notes, equation)
+		#insert new code here to handle gpr, notes, refs, etc...
+
+
 	def biomass(self, biomass_file, readquiet):
 		#read and define biomass equation...
 		if not readquiet:
@@ -712,35 +1060,40 @@ class cb:
 	def exchanges(self, exchanges_file, readquiet):
 		#read and define exchange metabolites.
 		if not readquiet:
-			print 'exchanges from', exchanges_file	
+			print 'exchanges from', source_name(exchanges_file)
 		exchanges = {}
-		file = open(exchanges_file)
+		file = open_source(exchanges_file)
 		while True:
 			line = file.readline()
 			if line == '': break
 			line = line.rstrip()
 			if line == '': continue
 			if line[0] == '#': continue
-			col = line.split()					## starting here, some changes here to cope with MM2 output
-			try:
-				lb, ub = col[1], col[2]
-			except:
-				lb, ub = '-1000', '1000'
-			rawmet = col[0]
-			
-			if not readquiet:
-				print ' ', rawmet
-
-			#convert metabolites from forms like 'leu-L[c]' to 'M_leu_DASH_L_c'...
-			met = eq_current.convert_metabolite_ext2int(rawmet)
-
-			exchanges[(met, lb, ub)] = 1													
+			exchanges[cb.read_exchange(self, line, readquiet)] = 1
 		exchangelist = exchanges.keys()
 		cb.set_exchanges(self, exchangelist)
 		if not readquiet:
 			print
 
 
+	def read_exchange(self, line, readquiet):
+		#parse one line of an exchanges file (metabolite, optional lower and upper bounds) into (met, lb, ub)
+		col = line.split()					## starting here, some changes here to cope with MM2 output
+		try:
+			lb, ub = col[1], col[2]
+		except:
+			lb, ub = '-1000', '1000'
+		rawmet = col[0]
+		
+		if not readquiet:
+			print ' ', rawmet
+
+		#convert metabolites from forms like 'leu-L[c]' to 'M_leu_DASH_L_c'...
+		met = eq_current.convert_metabolite_ext2int(rawmet)
+
+		return (met, lb, ub)
+
+
 	def constraints(self, constraints_file, readquiet):
 		#read and define user-specified reaction constraints
 		if not readquiet:
@@ -788,42 +1141,48 @@ class cb:
 	def gpr2(self, filename, readquiet):
 		#read gpr.txt file
 		if not readquiet:
-			print 'gpr from', filename
-		file = open(filename)
+			print 'gpr from', source_name(filename)
+		file = open_source(filename)
 		while True:
 			line = file.readline()
 			if line == '': break
 			line = line.rstrip()
 			if line == '': continue
-			if 'rg\t' == line[:3]:
-				rg, rxn, gpr = line.split('\t')[0], line.split('\t')[1], line.split('\t')[2]
-				cb.add_note(self, rxn, 'Gene_association: ' + gpr)
-				#skip if there is no gpr...
-				if gpr == '.':
-					continue
-				#if there is a gpr statement, add to REACTS and SIMPLEGPR...
-				self.REACTS[rxn] = 1
-				self.SIMPLEGPR[rxn] = gpr
-				#if there is an 'and' statement in gpr, then this must be a protein complex...
-				if 'and' in gpr:
-					self.COMPLEXES[rxn] = 1
-				#if there is more than one gene in gpr, and only 'or' statements, then this must be an isozyme...
-				if len(gpr.split()) > 1 and not 'and' in gpr:
-					self.ISOZYMES[rxn] = 1
-				for item in gpr.split(' '):
-					if item == 'and' or item == 'or':
-						continue
-					if item[0] == '(':
-						item = item[1:]
-					if item[-1] == ')':
-						item = item[:-1]
-					self.GENES[item] = 1
+			cb.read_gpr(self, line)
 		if not readquiet:
 			print
 
 
-	def build_from_textfiles(self, modelfile, biomassfile=None, sourcesfile=None, escapesfile=None, exchangesfile=None, constraintsfile=None, notesfile=None, gprfile=None, readquiet=False):
+	def read_gpr(self, line):
+		#record the gpr on one line of a gpr file: 'rg', reaction, gpr (tab-delimited)
+		if 'rg\t' == line[:3]:
+			rg, rxn, gpr = line.split('\t')[0], line.split('\t')[1], line.split('\t')[2]
+			cb.add_note(self, rxn, 'Gene_association: ' + gpr)
+			#skip if there is no gpr...
+			if gpr == '.':
+				return
+			#if there is a gpr statement, add to REACTS and SIMPLEGPR...
+			self.REACTS[rxn] = 1
+			self.SIMPLEGPR[rxn] = gpr
+			#if there is an 'and' statement in gpr, then this must be a protein complex...
+			if 'and' in gpr:
+				self.COMPLEXES[rxn] = 1
+			#if there is more than one gene in gpr, and only 'or' statements, then this must be an isozyme...
+			if len(gpr.split()) > 1 and not 'and' in gpr:
+				self.ISOZYMES[rxn] = 1
+			try:
+				genes = self.GPR.add(rxn, gpr)
+			except ValueError, error:
+				print 'WARNING--gpr of %s not used for knockouts: %s' % (rxn, error)
+				return
+			for item in genes:
+				self.GENES[item] = 1
+
+
+	def build_from_textfiles(self, modelfile, biomassfile=None, sourcesfile=None, escapesfile=None, exchangesfile=None, constraintsfile=None, notesfile=None, gprfile=None, readquiet=False, gpr_comma=None):
 		#one line command to build model from text files.
+		#gpr_comma: how comma separated gene lists in gprs are read, 'or' or 'and' (see set_gpr_comma)
+		cb.set_gpr_comma(self, gpr_comma)
 		cb.build(self, modelfile, readquiet)
 		if biomassfile:
 			cb.biomass(self, biomassfile, readquiet)
@@ -839,63 +1198,184 @@ class cb:
 			cb.notes(self, notesfile, readquiet)
 		if gprfile:
 			cb.gpr2(self, gprfile, readquiet)
+		cb.warn_gpr_comma(self, gpr_comma)
+
+
+	def set_gpr_comma (self, gpr_comma):
+		"""
+		How comma separated gene lists in gprs read from now on ('SSA_0981,SSA_0980') are taken: 'or' (isozymes, any one gene
+		is enough) or 'and' (subunits of a complex, every gene is needed). None keeps the current reading ('or' unless set),
+		and build_from_mm2 / build_from_textfiles then warn if the model has such lists (see warn_gpr_comma).
+		"""
+		if gpr_comma is None:
+			return
+		if not gpr_comma in ('or', 'and'):
+			raise ValueError("gpr_comma must be 'or' or 'and', not %r" % (gpr_comma,))
+		self.GPR.comma = gpr_comma
+
 
+	def warn_gpr_comma (self, gpr_comma):
+		#comma separated gene lists are ambiguous: read as 'or' while meant as 'and', knockouts would look less lethal than they are
+		if gpr_comma is not None:
+			return
+		commas = sorted([r for r in self.SIMPLEGPR if ',' in self.SIMPLEGPR[r]])
+		if commas:
+			print "WARNING--%d gprs list genes separated by commas (e.g. %s: %s), read as '%s'; build with gpr_comma='or' or gpr_comma='and' to choose" % (
+				len(commas), commas[0], self.SIMPLEGPR[commas[0]], self.GPR.comma)
 
 
-	def build_from_mm2(self, mm2file, readquiet=False):
+	def build_from_mm2(self, mm2file, readquiet=False, cache=True, gpr_comma=None):
 		#this is command to build model from modelfile downloaded from mm2 (includes exchanges, gpr, model)
-		modelfilename = mm2file[:-9] + '.model.txt'
-		modelfile_ = open(modelfilename, 'w')
-		gprfilename = mm2file[:-9] + '.gpr.txt'
-		gprfile_ = open(gprfilename, 'w')
-		exchangesfilename = mm2file[:-9] + '.exchanges.txt'
-		exchangesfile_ = open(exchangesfilename, 'w')
-		file = open(mm2file)
-		while True:
-			line = file.readline()
-			if line == '': break
+		#mm2file is a filename or an open file object / in-memory buffer; it is read once, and its '#exchanges:', '#gprs:' and '#model:'
+		#sections are parsed straight into the model (lines before any section header are sorted as before: 'R...' model, 'rg' gpr, rest exchanges)
+		#with cache=True and a filename, a compiled copy of the built model is kept next to mm2file (mm2file + '.cache') and reused until mm2file changes
+		#gpr_comma: how comma separated gene lists in gprs are read, 'or' or 'and' (see set_gpr_comma)
+		cb.set_gpr_comma(self, gpr_comma)
+		if hasattr(mm2file, 'read'):
+			content, cache = mm2file.read(), False
+		else:
+			infile = open(mm2file, 'rb')
+			content = infile.read()
+			infile.close()
+		#the cache holds a model built from the file alone, in a fresh instance: it is read (and written) only if this instance holds no model yet,
+		#and settings made on it beforehand (VMAX, constraints, objective, ...) are kept, never cached
+		if not cache or self.REACTIONS != {}:
+			cb.read_mm2(self, content, source_name(mm2file), readquiet)
+			cb.warn_gpr_comma(self, gpr_comma)
+			return
+		#the gprs are compiled with the comma reading in effect, so a cache is only good for the same one
+		digest = hashlib.sha1(content).hexdigest() + ' comma=' + self.GPR.comma
+		cachefilename = source_name(mm2file) + '.cache'
+		data = cb.load_cache(self, cachefilename, digest)
+		if data:
+			if not readquiet:
+				print 'model from', cachefilename
+				print
+		else:
+			fresh = cb()
+			cb.set_gpr_comma(fresh, self.GPR.comma)
+			cb.read_mm2(fresh, content, source_name(mm2file), readquiet)
+			data = cb.model_data(fresh)
+			cb.save_cache(self, cachefilename, digest, data)
+		cb.install_model_data(self, data)
+		cb.warn_gpr_comma(self, gpr_comma)
+
+
+	def read_mm2 (self, content, name, readquiet=False):
+		#parse the text of an mm2 file into the model
+		if not readquiet:
+			print 'model, exchanges, gpr from', name
+		#exchanges need the model's species and gprs its reactions, so those two (short) sections are held until the model is in
+		exchanges, gprlines = {}, []
+		section = None
+		for line in content.splitlines():
 			line = line.rstrip()
 			if line == '': continue
-			if line[0] == '#': continue
-			if line[:1] == 'R':
-				print >>modelfile_, line
-				continue
-			elif line[:2] == 'rg':
-				print >>gprfile_, line
+			if line[0] == '#':
+				if line[:9] == '#exchange':
+					section = 'exchanges'
+				elif line[:4] == '#gpr':
+					section = 'gprs'
+				elif line[:6] == '#model':
+					section = 'model'
 				continue
+			if section == 'model' or (section is None and line[:1] == 'R'):
+				cb.read_reaction(self, line)
+			elif section == 'gprs' or (section is None and line[:2] == 'rg'):
+				gprlines.append(line)
 			else:
-				print >>exchangesfile_, line
-				continue
-		modelfile_.close()
-		exchangesfile_.close()
-		gprfile_.close()
-		cb.build_from_textfiles(self, modelfilename, exchangesfile=exchangesfilename, gprfile=gprfilename, readquiet=readquiet)
+				exchanges[cb.read_exchange(self, line, readquiet)] = 1
+		cb.set_exchanges(self, exchanges.keys())
+		for line in gprlines:
+			cb.read_gpr(self, line)
+		if not readquiet:
+			print
+
+
+	def model_data (self):
+		#the attributes a model file fills in (MODEL_DATA), plus the VMAX their bounds were built with
+		data = dict([(key, self.__dict__[key]) for key in MODEL_DATA])
+		data['VMAX'] = self.VMAX
+		return data
+
+
+	def install_model_data (self, data):
+		#take a model read from a file (from model_data, e.g. out of a cache) into this instance, which holds no model yet, keeping its settings
+		#constraints set beforehand stay, unless the file sets bounds on the same reaction (as when the file is read into this instance)
+		constraints = self.CONSTRAINTS.copy()
+		constraints.update(data['CONSTRAINTS'])
+		for key in MODEL_DATA:
+			self.__dict__[key] = data[key]
+		self.CONSTRAINTS = constraints
+		self.REVISION += 1
+		self.CHANGED_BOUNDS = {}
+		self.EQUATIONS = {}
+		if self.SOLVE_CACHE:
+			self.SOLVE_CACHE.clear()
+		#S has the bounds of the file's constraints and the VMAX it was built with; bring it in line with this instance
+		if self.VMAX != data['VMAX']:
+			changed = self.REACTIONS
+		else:
+			changed = [r for r in constraints if r in self.REACTIONS and not r in data['CONSTRAINTS']]
+		for r in changed:
+			cb.update_bounds(self, r)
+
+
+	def save_cache (self, cachefilename, digest, data):
+		"Write a model read from a file (from model_data) to a binary cache file, tagged with the digest of its source. Returns True if written."
+		tmpfilename = cachefilename + '.' + str(os.getpid())
+		try:
+			outfile = open(tmpfilename, 'wb')
+			marshal.dump((CACHE_MAGIC, CACHE_VERSION, CACHE_LAYOUT, digest), outfile)
+			marshal.dump(pack_model_data(data), outfile)
+			outfile.close()
+			#rename is atomic, so parallel jobs never read a half written cache
+			os.rename(tmpfilename, cachefilename)
+		except (IOError, OSError):
+			#e.g., read-only model directory; the cache is only an optimization
+			return False
+		return True
+
+
+	def load_cache (self, cachefilename, digest):
+		"The model data in a cache file written by save_cache, if it exists and was made from a source with this digest by this version (else None); see install_model_data."
+		try:
+			infile = open(cachefilename, 'rb')
+		except IOError:
+			return None
+		#making the records with the garbage collector paused is several times faster
+		gc.disable()
+		try:
+			try:
+				if marshal.load(infile) != (CACHE_MAGIC, CACHE_VERSION, CACHE_LAYOUT, digest):
+					return None
+				return unpack_model_data(marshal.load(infile))
+			except Exception:
+				#unreadable, truncated or malformed cache; rebuild
+				return None
+		finally:
+			gc.enable()
+			infile.close()
 		
 
 
 		
 	#calculator: given vector of gene presence/absence, calculate reaction presence/absence
 	def calc (self):
-		#make copies of the transcr, prots, reacts dictionaries so you don't change the global ones
-		genes = self.GENES.copy()
-		transcr = self.TRANSCR.copy()
-		for t in transcr:
-			#here and below, ensure that transcr[t] (or prots[p], ...) is a string so can use eval()
-			#might be an integer, if you've specified a vector for presence/absence of transcripts
-			transcr[t] = str(transcr[t])
-			transcr[t] = eval(transcr[t])
-		prots = self.PROTS.copy()
-		for p in prots:
-			prots[p] = str(prots[p])
-			prots[p] = eval(prots[p])
-		reacts = self.REACTS.copy()
+		#genes set to 0 in self.GENES knock out reactions through the compiled gprs; reactions set to 0 in self.REACTS are knocked out directly
+		#(transcripts and proteins have no rules of their own in this version, so TRANSCR and PROTS do not change the result)
 		deletedrxns = {}
-		for r in reacts:
-			reacts[r] = str(reacts[r])
-			reacts[r] = eval(reacts[r])
-			if reacts[r] == 0 and r in self.REACTIONS:
+		for r in cb.reactions_lost(self, [g for g in self.GENES if not int(self.GENES[g])]):
+			deletedrxns[r] = 1
+		for r in self.REACTS:
+			if not int(self.REACTS[r]) and r in self.REACTIONS:
 				deletedrxns[r] = 1
 		return deletedrxns
+
+
+	def reactions_lost (self, genes_off):
+		"Reactions of the model disabled by their gprs when the given genes are off (all other genes on)."
+		return [r for r in self.GPR.lost(genes_off) if r in self.REACTIONS]
 				
 
 	def deletions (self, level):
@@ -911,8 +1391,7 @@ class cb:
 			deletedrxns = cb.calc(self)
 			#now constrain each reaction that is deleted by the change to have zero flux, attempt fba
 			for r in deletedrxns:
-				name, rev, notes, equation = self.REACTIONS[r]
-				if rev:
+				if self.REACTIONS[r].rev:
 					lbound = '-' + self.VMAX
 				else:
 					lbound = '0'
@@ -921,7 +1400,7 @@ class cb:
 				cb.solve(self, verbose=False)
 				#if status != OPTIMAL or objective value is < 25% of 'wild type', print item, reaction, and results
 				if (not self.STATUS == 'OPTIMAL') or (float(self.OBJECTIVE_VALUE) < 0.25 * float(fullobjectivevalue)):
-					reactionequation = eq_current.makestring(equation, rev)
+					reactionequation = cb.get_equation(self, r)
 					print item + '\t' + r + '\t' + reactionequation + '\t' + self.STATUS + '\t' + str(self.OBJECTIVE_VALUE)
 					lethals[item] = 1
 				#reset reaction constraints to default	
@@ -931,152 +1410,484 @@ class cb:
 		return lethals
 			
 
-	def paul (self):
-		"Algorithm to find a minimal set of source / escape reactions to convert a model with no solutions to one with a solution."
-		#:::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
-		#WRITE *.dat FILE....
-
-		datfilename = self.MODEL_ID + '.dat'
-		datfile = open(datfilename, 'w')
-		print >>datfile, "set REACTIONS := "
-		for r in self.REACTIONS:
-			print >>datfile, r,
-		print >>datfile, ";\n"
-		print >>datfile, "set METABOLITES := "
-		for s in self.SPECIES:
-			print >>datfile, s,
-		print >>datfile, ";\n"
-		print >>datfile, "set KNOWNSOURCES := "
-		for s in self.SOURCES:
-			print >>datfile, s[:-1] + 'b',
-		print >>datfile, ";\n"
-		print >>datfile, "set NOTSOURCES := "
-		for n in self.NOTSOURCES:
-			print >>datfile, n,
-		print >>datfile, ";\n"
-		print >>datfile, "set KNOWNESCAPES := "
-		for e in self.ESCAPES:
-			print >>datfile, e[:-1] + 'b',
-		print >>datfile, ";\n"
-		print >>datfile, "set NOTESCAPES := "
-		for n in self.NOTESCAPES:
-			print >>datfile, n,
-		print >>datfile, ";\n"
-		print >>datfile, "set BIOMASSREACTION := " + self.OBJECTIVE[1] + ";"
-		print >>datfile, "\n"
-		print >>datfile, "param S := "
-		
-		mets = {}
-		constraints = {}
-		for ID in self.REACTIONS:
-					
-			name, reversible, notes, equation = self.REACTIONS[ID]
-						
-			#if there have been specific constraints already set, use them...
-			if ID in self.CONSTRAINTS:
-				lbound, ubound = self.CONSTRAINTS[ID]
-			#otherwise create constraints on the fly, using reaction reversibility and self.VMAX...
+	def knockout (self, reactions):
+		"Solve with the given reactions constrained to zero flux, then put their constraints back. Returns (status, objective value)."
+		saved = []
+		for r in reactions:
+			saved.append((r, self.CONSTRAINTS.get(r)))
+			cb.set_constraint(self, r, 0, 0)
+		cb.solve(self, verbose=False, duals=False)
+		for r, constraint in saved:
+			if constraint:
+				cb.set_constraint(self, r, constraint[0], constraint[1])
 			else:
-				ubound = self.VMAX
-				if bool(reversible):
-					lbound = '-' + self.VMAX
-				else:
-					lbound = '0'
-			constraints[ID] = (lbound, ubound)	
-				
-			#create a data structure called 'mets': keys are metabolites, values are (reactionID, coef); this is essentially "S * v"
-			for reactant in equation[0]:
-				species, coef = reactant[0], '-' + str(reactant[1])
-				#if '_b' == species[-2:]:
-				#	continue
-				if not species in mets:
-					mets[species] = []
-				mets[species].append((ID, coef))
-				
-			for product in equation[1]:
-				species, coef = product[0], product[1]
-				#if '_b' == species[-2:]:
-				#	continue
-				if not species in mets:
-					mets[species] = []
-				mets[species].append((ID, coef))
+				cb.unset_constraint(self, r)
+		return self.STATUS, self.OBJECTIVE_VALUE
 
-		#:::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
 
-		for m in mets:
-			rclist = mets[m]
-			for rxn, coef in rclist:
-				print >>datfile, m, rxn, coef
-		print >>datfile, ";"
-		print >>datfile, "param lb := "
-		for r in self.REACTIONS:
-			if r in constraints:
-				lbound, ubound = constraints[r]
-				print >>datfile, r, lbound
-		print >>datfile, ";"
-		print >>datfile, "param ub := "
+	def flux_support (self):
+		"Reactions carrying flux in the last solution (flux values printed as 0 are round-off below solvers.ZERO_TOLERANCE)."
+		support = {}
+		for r in self.REACTION2FLUXVALUE:
+			if float(self.REACTION2FLUXVALUE[r]) != 0:
+				support[r] = 1
+		return support
+
+
+	def deletion_candidates (self):
+		"Reactions worth deleting in scans: all except sources, escapes, exchanges and the objective."
+		candidates = []
 		for r in self.REACTIONS:
-			if r in constraints:
-				lbound, ubound = constraints[r]
-				print >>datfile, r, ubound
-		print >>datfile, ";"
-		print >>datfile, "param minbiomass := " + '1' + ";"
-		print >>datfile, "end;\n"
-		
-		datfile.close()
-		
-		com1 = "/Users/seth/.lib/python/glpsol --tmlim 50 -m /Users/seth/.lib/python/metmodel/transport.mod -d " + datfilename + " -o transport.out"
-		com2 = "rm " + datfilename
-		com3 = "python /Users/seth/.lib/python/metmodel/out2transports.py transport.out" # > " + self.MODEL_ID + ".se"
-		com4 = "rm transport.out"
-
-		os.system(com1)
-		#os.system(com2)
-		os.system(com3)
-		#os.system(com4)
+			if 'R_SRC' in r or 'R_ESC' in r or 'R_EXCH' in r or r == self.OBJECTIVE[1]:
+				continue
+			candidates.append(r)
+		return candidates
+
+
+	def deleted_reactions (self, item):
+		"Reactions knocked out when a gene, protein or reaction is deleted (a reaction deletes itself; others via the boolean rules in 'calc')."
+		if item in self.REACTIONS:
+			return [item]
+		if item in self.GENES:
+			return cb.reactions_lost(self, [item])
+		for level in (self.TRANSCR, self.PROTS, self.REACTS):
+			if item in level:
+				level[item] = 0
+				deletedrxns = cb.calc(self)
+				level[item] = 1
+				return deletedrxns.keys()
+		print 'WARNING--%s is not a gene, protein or reaction of the model' % (item)
+		return []
+
+
+	def knockout_key (self, reactions):
+		#what a knockout of these reactions changes in the LP: the reactions, or on a compressed model their columns (removed reactions change nothing)
+		if self.COMPRESSION:
+			return self.COMPRESSION.columns(reactions)
+		return tuple(sorted(reactions))
+
+
+	def single_deletions (self, targets=None, workers=1, threshold=1e-6):
+		"""
+		Delete reactions or genes one at a time, splitting the candidates across 'workers' processes (None = one per core).
+		targets defaults to all reactions except sources, escapes, exchanges and the objective; a gene target knocks out
+		all reactions it deletes together. Targets that knock out the same set of reactions share one solve, and targets that
+		knock out nothing (e.g. one of several isozymes) take the wild type result without a solve.
+		A deletion is 'lethal' if the status is not OPTIMAL or the objective is below threshold
+		(default 1e-6: 'zero' objectives come back as round-off of order 1e-10, on either side of 0).
+		Returns a table, one row (dict) per target, in target order, with keys:
+			id, reactions, status, objective, call, gpr, subsystem, equation
+		"""
+		if targets is None:
+			targets = cb.deletion_candidates(self)
+		knockouts = [cb.deleted_reactions(self, item) for item in targets]
+
+		#group targets by the set of reactions they knock out (by the LP columns, if the model is compressed); each distinct, non-empty set is solved once
+		set2index, unique = {}, []
+		for reactions in knockouts:
+			key = cb.knockout_key(self, reactions)
+			if key and not key in set2index:
+				set2index[key] = len(unique)
+				unique.append(reactions)
+
+		#the wild type solve also gives every worker copy a session to start from
+		cb.solve(self, verbose=False)
+		wildtype = (self.STATUS, self.OBJECTIVE_VALUE)
+		results = run_parallel(self, knockout_task, unique, workers)
+
+		table = []
+		for item, reactions in zip(targets, knockouts):
+			key = cb.knockout_key(self, reactions)
+			if key:
+				status, objectivevalue = results[set2index[key]]
+			else:
+				status, objectivevalue = wildtype
+			if (not status == 'OPTIMAL') or float(objectivevalue) < threshold:
+				call = 'lethal'
+			else:
+				call = 'nonlethal'
+			gprs, subsystems, equations = [], [], []
+			for r in reactions:
+				gprs.append(cb.get_notes(self, r, 'Gene_association: '))
+				subsystems.append(cb.get_notes(self, r, 'SUBSYSTEM: '))
+				equations.append(cb.get_equation(self, r))
+			table.append({'id':item, 'reactions':(' ').join(reactions), 'status':status, 'objective':objectivevalue, 'call':call,
+						'gpr':('; ').join(gprs), 'subsystem':('; ').join(subsystems), 'equation':('; ').join(equations)})
+		return table
+
+
+	def gene_deletions (self, genes=None, workers=1, threshold=1e-6):
+		"Delete genes one at a time (default: all genes with a gpr) via single_deletions: each distinct set of lost reactions is solved once, with all of them knocked out together."
+		if genes is None:
+			genes = [g for g in self.GPR.genes if g in self.GENES]
+		return cb.single_deletions(self, genes, workers, threshold)
+
+
+	def print_deletions (self, table, out=False):
+		"Print a deletion table (from single_deletions) as tab-delimited lines: id, objective, call, gpr, subsystem, equation. Argument is out=<fn>."
+		if out:
+			outfi = open(out, 'w')
+		for row in table:
+			line = row['id'] + '\t' + str(row['objective']) + '\t' + row['call'] + '\t' + row['gpr'] + '\t' + row['subsystem'] + '\t' + row['equation']
+			if out:
+				print >>outfi, line
+			else:
+				print line
+		if out:
+			outfi.close()
+
+
+	def paul (self, minbiomass=None, exact=False, time_limit=60):
+		"""
+		Find a minimal set of source / escape reactions that converts a model with no solution (objective below minbiomass) into one with a solution.
+		Every balanced metabolite without a source (escape) is a candidate for one, except those listed in NOTSOURCES (NOTESCAPES);
+		sources, escapes and exchanges already in the model are free. The LP relaxation (minimize the total flux through the candidates)
+		picks the candidates it uses; these are then pruned one at a time, smallest flux first, keeping a removal whenever the model still
+		solves, which leaves a set with nothing left to remove. exact=True then runs a MILP (one binary per candidate, GLPK's branch and
+		cut, at most time_limit seconds) for a smaller set; if there is none, the heuristic's set is proven to be a smallest one.
+		minbiomass defaults to MINBIOMASS. Returns (sources, escapes), two sorted lists of metabolites: ([], []) if the model already
+		reaches minbiomass without new sources / escapes. Returns None (and prints a warning) if it does not reach minbiomass
+		even with every candidate.
+		"""
+		if minbiomass is None:
+			minbiomass = self.MINBIOMASS
+		objective = self.OBJECTIVE[1]
+
+		#a trial copy with a candidate source and escape for every eligible metabolite; each also makes one unit of a
+		#cost metabolite, so minimizing the flux through R_PAUL_COST minimizes the total flux through the candidates
+		trial = cb.copy(self)
+		trial.SOLVE_CACHE = None
+		cost = 'M_paulcost_c'
+		notsources, notescapes = dict.fromkeys(self.NOTSOURCES), dict.fromkeys(self.NOTESCAPES)
+		S = self.S
+		indptr, cols, coefs = S.csr()
+		candidates = {}
+		for i, species in enumerate(S.metabolites):
+			if not S.balanced[i] or indptr[i] == indptr[i + 1]:
+				continue
+			boundary = species[:-1] + 'b'
+			if not species in notsources and not 'R_SRC_' + species[2:] in self.REACTIONS:
+				candidates['R_SRC_' + species[2:]] = ('source', species)
+				cb.add_reaction(trial, 'R_SRC_' + species[2:], '. source flux', False, {'SUBSYSTEM: SourceFlux':1, 'EC: .':1},
+								[[(boundary, '1')], [(species, '1'), (cost, '1')]])
+			if not species in notescapes and not 'R_ESC_' + species[2:] in self.REACTIONS:
+				candidates['R_ESC_' + species[2:]] = ('escape', species)
+				cb.add_reaction(trial, 'R_ESC_' + species[2:], '. escape flux', False, {'SUBSYSTEM: EscapeFlux':1, 'EC: .':1},
+								[[(species, '1')], [(boundary, '1'), (cost, '1')]])
+		cb.add_reaction(trial, 'R_PAUL_COST', 'paul cost', False, {}, [[(cost, '1')], [(cost[:-1] + 'b', '1')]])
+		lbound, ubound = cb.get_bounds(trial, objective)
+		cb.set_constraint(trial, objective, minbiomass, ubound)
+		cb.set_objective(trial, 'Minimize', 'R_PAUL_COST')
+
+		#LP relaxation; the candidates it uses are the starting set
+		cb.solve(trial, verbose=False, duals=False)
+		if not trial.STATUS == 'OPTIMAL':
+			print 'WARNING--no set of sources / escapes lets %s reach %s (%s)' % (objective, minbiomass, trial.STATUS)
+			return None
+		used = [(float(trial.REACTION2FLUXVALUE[r]), r) for r in candidates if float(trial.REACTION2FLUXVALUE[r]) != 0]
+		for r in candidates:
+			if float(trial.REACTION2FLUXVALUE[r]) == 0:
+				cb.set_constraint(trial, r, 0, 0)
+
+		#greedy pruning: drop each used candidate the model can do without
+		chosen = {}
+		used.sort()
+		for flux, r in used:
+			cb.set_constraint(trial, r, 0, 0)
+			cb.solve(trial, verbose=False, duals=False)
+			if not trial.STATUS == 'OPTIMAL':
+				cb.unset_constraint(trial, r)
+				chosen[r] = 1
+
+		if exact and chosen:
+			#exact refinement over all candidates: look only for sets smaller than the heuristic's, so that
+			#INFEASIBLE proves the heuristic's set is a smallest one
+			for r in candidates:
+				cb.unset_constraint(trial, r)
+			status, milp = solvers.min_support(trial, sorted(candidates), len(chosen) - 1, time_limit)
+			if status in ('OPTIMAL', 'FEASIBLE'):
+				chosen = dict.fromkeys(milp, 1)
+			if not status in ('OPTIMAL', 'INFEASIBLE'):
+				print 'WARNING--the MILP did not finish within %s seconds (%s); the set found may not be the smallest' % (time_limit, status)
+
+		sources = sorted([candidates[r][1] for r in chosen if candidates[r][0] == 'source'])
+		escapes = sorted([candidates[r][1] for r in chosen if candidates[r][0] == 'escape'])
+		return sources, escapes
 		
 	
 		
-	def ddeletions (self):
-		"Double deletions at the reaction level."
+	def ddeletions (self, targets=None, workers=1, threshold=1e-6):
+		"""
+		Double deletions at the reaction level; returns the synthetic lethal pairs (lethal together, neither lethal alone).
+		targets defaults to deletion_candidates(); pairs are split across 'workers' processes (None = one per core).
+		Only pairs that can change the optimum are solved: if r2 carries no flux in the optimal solution with r1 knocked out
+		(the wild type solution, if r1 carries none there), that solution survives deleting r2 too, and likewise the other way round.
+		Returns a table, one row (dict) per pair, with keys:
+			id1, id2, status, objective, call, equation1, equation2
+		"""
+		if targets is None:
+			targets = cb.deletion_candidates(self)
+
+		#wild type solution; its support stands in for the knockout solution of every reaction that carries no flux
 		cb.solve(self, verbose=False)
-		essential_reactions = cb.deletion_testing(self)
+		wildtype_support = cb.flux_support(self)
+
+		#single deletions, only needed for reactions carrying flux in the wild type
+		carrying = [r for r in targets if r in wildtype_support]
+		results = run_parallel(self, knockout_support_task, [[r] for r in carrying], workers)
+		support, essential = {}, {}
+		for r in targets:
+			support[r] = wildtype_support
+		for r, (status, objectivevalue, knockout_support) in zip(carrying, results):
+			if (not status == 'OPTIMAL') or float(objectivevalue) < threshold:
+				essential[r] = 1
+			else:
+				support[r] = knockout_support
+
+		#pairs of non-essential reactions that each carry flux in the other's knockout solution
+		nonessential = [r for r in targets if not r in essential]
+		position = {}
+		for i, r in enumerate(nonessential):
+			position[r] = i
+		pairs = []
+		for r in nonessential:
+			for r2 in support[r]:
+				if position.get(r2, -1) > position[r] and r in support[r2]:
+					pairs.append([r, r2])
+
+		results = run_parallel(self, knockout_task, pairs, workers)
+
+		table = []
+		for (r, r2), (status, objectivevalue) in zip(pairs, results):
+			if status == 'OPTIMAL' and float(objectivevalue) >= threshold:
+				continue
+			table.append({'id1':r, 'id2':r2, 'status':status, 'objective':objectivevalue, 'call':'lethal',
+						'equation1':cb.get_equation(self, r), 'equation2':cb.get_equation(self, r2)})
+		return table
 
-		fullstatus, fullobjectivevalue = self.STATUS, self.OBJECTIVE_VALUE
-		for i, r in enumerate(self.REACTIONS.keys()):
-			if not r == self.OBJECTIVE[1] and not r in essential_reactions and not 'R_ESC' in r and not 'R_SRC' in r:
-				name, rev, notes, equation = self.REACTIONS[r]
-				if rev:
-					lbound = '-' + self.VMAX
-				else:
-					lbound = '0'
-				default_lbound, default_ubound = self.CONSTRAINTS.get(r, (lbound, self.VMAX))
-				cb.set_constraint(self, r, 0, 0)
-				
-				for j, r2 in enumerate(self.REACTIONS.keys()[i+1:]):
-					if not r2 == self.OBJECTIVE[1] and not r2 in essential_reactions and not 'R_ESC' in r2 and not 'R_SRC' in r2:
-						name2, rev2, notes2, equation2 = self.REACTIONS[r2]
-						if rev2:
-							lbound2 = '-' + self.VMAX
-						else:
-							lbound2 = '0'
-						default_lbound2, default_ubound2 = self.CONSTRAINTS.get(r2, (lbound2, self.VMAX))
-						cb.set_constraint(self, r2, 0, 0)
-				
-						cb.solve(self, verbose=False)
-						
-						if (not self.STATUS == 'OPTIMAL') or (float(self.OBJECTIVE_VALUE) < 0.25 * float(fullobjectivevalue)):
-							reactionequation1 = eq_current.makestring(equation, rev)
-							reactionequation2 = eq_current.makestring(equation2, rev2)
-							print self.STATUS + '\t' + str(self.OBJECTIVE_VALUE)
-							print r + '\t' + reactionequation1
-							print r2 + '\t' + reactionequation2
-							print
-						cb.set_constraint(self, r2, default_lbound2, default_ubound2)
-						
-				cb.set_constraint(self, r, default_lbound, default_ubound)	
 
-			
-			
-		
-			
+	def print_ddeletions (self, table, out=False):
+		"Print a double deletion table (from ddeletions) as tab-delimited lines: id1, id2, status, objective, equation1, equation2. Argument is out=<fn>."
+		if out:
+			outfi = open(out, 'w')
+		for row in table:
+			line = row['id1'] + '\t' + row['id2'] + '\t' + row['status'] + '\t' + str(row['objective']) + '\t' + row['equation1'] + '\t' + row['equation2']
+			if out:
+				print >>outfi, line
+			else:
+				print line
+		if out:
+			outfi.close()
+
+
+	def flux_range (self, reaction):
+		"Minimum and maximum flux through a reaction under the current constraints (nan if a solve is not OPTIMAL). Leaves the objective on the reaction."
+		limits = []
+		for goal in ('Minimize', 'Maximize'):
+			cb.set_objective(self, goal, reaction)
+			cb.solve(self, verbose=False, duals=False)
+			if self.STATUS == 'OPTIMAL':
+				limits.append(float(self.OBJECTIVE_VALUE))
+			else:
+				limits.append(float('nan'))
+		return tuple(limits)
+
+
+	def fva (self, reactions=None, fraction_of_optimum=1.0, workers=1):
+		"""
+		Flux variability analysis: the range of flux through each reaction while the objective stays within fraction_of_optimum of its optimum.
+		The objective is solved and held once; the min / max solves then run reaction after reaction, each one re-optimizing from the previous
+		basis, split across 'workers' processes (None = one per core). reactions defaults to all reactions.
+		Returns (minimum, maximum), two arrays of floats aligned to the reaction index (m.S.reactions / m.S.reaction2index;
+		m.COMPRESSION.full.reactions on a compressed model, where each lump is solved once and removed reactions are 0);
+		reactions not analyzed, and solves that are not OPTIMAL, are nan. Returns None if the objective itself cannot be solved.
+		"""
+		index = self.S
+		if self.COMPRESSION:
+			index = self.COMPRESSION.full
+		if reactions is None:
+			reactions = list(index.reactions)
+		for r in reactions:
+			if not r in self.REACTIONS:
+				print 'WARNING--%s is not in REACTIONS; left out of fva' % (r)
+		reactions = [r for r in reactions if r in self.REACTIONS]
+		objective = self.OBJECTIVE
+		cb.solve(self, verbose=False)
+		if not self.STATUS == 'OPTIMAL':
+			print 'WARNING--cannot run fva: objective %s is %s' % (objective[1], self.STATUS)
+			return None
+		optimum = float(self.OBJECTIVE_VALUE)
+
+		#hold the objective reaction within the fraction of its optimum; the slack covers the rounding of the reported objective value
+		allowance = (1 - fraction_of_optimum) * abs(optimum) + 1e-9 * max(1.0, abs(optimum))
+		saved = self.CONSTRAINTS.get(objective[1])
+		lbound, ubound = cb.get_bounds(self, objective[1])
+		if objective[0].lower().startswith('max'):
+			cb.set_constraint(self, objective[1], repr(optimum - allowance), ubound)
+		else:
+			cb.set_constraint(self, objective[1], lbound, repr(optimum + allowance))
+		#on a compressed model, the range of a lumped reaction is its factor times the range of its column
+		columns = reactions
+		if self.COMPRESSION:
+			columns = sorted(dict([(self.COMPRESSION.column[r][0], 1) for r in reactions if r in self.COMPRESSION.column]))
+		try:
+			ranges = dict(zip(columns, run_parallel(self, fva_task, columns, workers)))
+		finally:
+			if saved:
+				cb.set_constraint(self, objective[1], saved[0], saved[1])
+			else:
+				cb.unset_constraint(self, objective[1])
+			cb.set_objective(self, objective[0], objective[1])
+
+		minimum = array('d', [float('nan')]) * len(index.reactions)
+		maximum = array('d', [float('nan')]) * len(index.reactions)
+		for r in reactions:
+			j = index.reaction2index[r]
+			if not self.COMPRESSION:
+				minimum[j], maximum[j] = ranges[r]
+			elif r in self.COMPRESSION.removed:
+				minimum[j], maximum[j] = 0.0, 0.0
+			else:
+				column, factor = self.COMPRESSION.column[r]
+				low, high = ranges[column]
+				if factor < 0:
+					low, high = high, low
+				minimum[j], maximum[j] = factor * low, factor * high
+		return minimum, maximum
+
+
+	def restore_constraint (self, reaction, constraint):
+		#put back a constraint saved with self.CONSTRAINTS.get(reaction) (None: the reaction had no constraint)
+		if constraint:
+			cb.set_constraint(self, reaction, constraint[0], constraint[1])
+		else:
+			cb.unset_constraint(self, reaction)
+
+
+	def production_envelope (self, x_exchange, y_reaction, points=20, workers=1):
+		"""
+		Production envelope: the minimum and maximum flux through y_reaction (e.g. ethanol secretion) with x_exchange (e.g. cellobiose uptake)
+		fixed at 'points' evenly spaced values across its feasible range under the current constraints. Neighboring values are solved one after
+		another, each from the previous basis, in contiguous blocks split across 'workers' processes (None = one per core).
+		Returns (x, ymin, ymax), three arrays of floats (nan where a solve is not OPTIMAL), or None if x_exchange cannot carry flux.
+		"""
+		if workers is None:
+			workers = multiprocessing.cpu_count()
+		objective, saved = self.OBJECTIVE, self.CONSTRAINTS.get(x_exchange)
+		try:
+			low, high = cb.flux_range(self, x_exchange)
+			if low != low or high != high:
+				print 'WARNING--cannot make an envelope: the range of %s could not be solved' % (x_exchange)
+				return None
+			xvalues = grid(low, high, points)
+			tasks = [(x_exchange, y_reaction, block) for block in blocks(list(xvalues), workers)]
+			ranges = []
+			for result in run_parallel(self, envelope_task, tasks, workers):
+				ranges.extend(result)
+		finally:
+			cb.restore_constraint(self, x_exchange, saved)
+			cb.set_objective(self, objective[0], objective[1])
+		return xvalues, array('d', [low for low, high in ranges]), array('d', [high for low, high in ranges])
+
+
+	def phase_plane (self, x_exchange, y_exchange, points=20, workers=1):
+		"""
+		Phenotypic phase plane: the objective value on a 'points' x 'points' grid of fluxes through x_exchange and y_exchange, each spanning
+		its feasible range under the current constraints. The grid is solved in a serpentine order (each point next to the last, from its basis),
+		in contiguous blocks split across 'workers' processes (None = one per core).
+		Returns (x, y, values): two arrays of grid values and one dense array of objective values, row i for x[i] (values[i * len(y) + j]
+		is the objective at x[i], y[j]; nan where a solve is not OPTIMAL). Returns None if either exchange cannot carry flux.
+		"""
+		if workers is None:
+			workers = multiprocessing.cpu_count()
+		objective, saved = self.OBJECTIVE, (self.CONSTRAINTS.get(x_exchange), self.CONSTRAINTS.get(y_exchange))
+		try:
+			axes = []
+			for exchange in (x_exchange, y_exchange):
+				low, high = cb.flux_range(self, exchange)
+				if low != low or high != high:
+					print 'WARNING--cannot make a phase plane: the range of %s could not be solved' % (exchange)
+					return None
+				axes.append(grid(low, high, points))
+			xvalues, yvalues = axes
+			#serpentine order: y runs up for even rows of x and down for odd ones
+			order = []
+			for i in range(len(xvalues)):
+				columns = range(len(yvalues))
+				if i % 2:
+					columns.reverse()
+				order.extend([(i, j) for j in columns])
+			tasks = [(x_exchange, y_exchange, objective, [(xvalues[i], yvalues[j]) for i, j in block]) for block in blocks(order, workers)]
+			values = array('d', [float('nan')]) * (len(xvalues) * len(yvalues))
+			position = 0
+			for result in run_parallel(self, phase_plane_task, tasks, workers):
+				for value in result:
+					i, j = order[position]
+					values[i * len(yvalues) + j] = value
+					position += 1
+		finally:
+			cb.restore_constraint(self, x_exchange, saved[0])
+			cb.restore_constraint(self, y_exchange, saved[1])
+			cb.set_objective(self, objective[0], objective[1])
+		return xvalues, yvalues, values
+
+
+	def sample (self, n, out, thinning=100, workers=1, seed=None):
+		"""
+		Flux sampling by artificial centering hit-and-run (ACHR) over S * v = 0 within the bounds in effect (CONSTRAINTS, or VMAX and reversibility);
+		fix the objective (e.g. a minimum growth rate) with set_constraint first if wanted. The warmup points are the optima minimizing and
+		maximizing each reaction (each LP column, on a compressed model), solved in-process with GLPK. 'workers' chains (None = one per core)
+		then walk from their center, keep every 'thinning'-th point, and write their share of the n samples straight into the file 'out'
+		(one row of floats per sample, one column per reaction, listed in out + '.reactions'), so samples never have to fit in memory.
+		The chains are plain Python, so sampling a compressed model (compress) is much faster. seed makes a run repeatable.
+		Returns a sampling.samples reading the file through a memory map, or None if the model is infeasible.
+		"""
+		assert solvers.GLPK, 'sample needs the GLPK shared library for its warmup points.'
+		if workers is None:
+			workers = multiprocessing.cpu_count()
+		if seed is None:
+			seed = random.randrange(1 << 30)
+
+		#warmup points: the (unrounded) optimal fluxes at both ends of every reaction that is free to vary
+		saved = (self.SOLVER, self.SOLVE_CACHE, self.OBJECTIVE)
+		self.SOLVER, self.SOLVE_CACHE = 'glpk', None
+		warmup = []
+		try:
+			for j, r in enumerate(self.S.reactions):
+				if self.S.lb[j] == self.S.ub[j]:
+					continue
+				for goal in ('Minimize', 'Maximize'):
+					cb.set_objective(self, goal, r)
+					cb.solve(self, verbose=False, duals=False)
+					if not self.STATUS == 'OPTIMAL':
+						print 'WARNING--cannot sample: %s %s is %s' % (goal, r, self.STATUS)
+						return None
+					warmup.append(self.SESSION.primal())
+		finally:
+			self.SOLVER, self.SOLVE_CACHE = saved[0], saved[1]
+			cb.set_objective(self, saved[2][0], saved[2][1])
+		if not warmup:
+			print 'WARNING--cannot sample: no reaction is free to vary'
+			return None
+
+		#samples are written for every reaction of the model; on a compressed model, each is its factor times its column
+		index, expansion = self.S, None
+		if self.COMPRESSION:
+			index, expansion = self.COMPRESSION.full, []
+			for r in index.reactions:
+				if r in self.COMPRESSION.column:
+					column, factor = self.COMPRESSION.column[r]
+					expansion.append((self.S.reaction2index[column], factor))
+				else:
+					expansion.append((-1, 0.0))
+		sampling.create(out, index.reactions, n)
+
+		#split the n samples between the chains
+		chains = max(1, min(workers, n))
+		tasks, first = [], 0
+		for i in range(chains):
+			rows = n // chains + int(i < n % chains)
+			tasks.append((warmup, list(self.S.lb), list(self.S.ub), first, rows, thinning, seed + i, out, expansion))
+			first += rows
+		run_parallel(self, sample_task, tasks, chains)
+		return sampling.samples(out)
@@ -0,0 +1,109 @@
+#script purpose: thin client for modeld.py: send requests to the model daemon over its Unix domain socket and read the replies
+	#uses only standard Python modules, so a call costs a connect and the LP, not loading metmodelCLI or a model
+#usage:
+#	python modelclient.py solve '{"model": "cthmodel", "knockouts": ["R_PFL"], "fluxes": ["R_EXCH_etoh_e"]}'
+#	python modelclient.py models
+#	python modelclient.py - < requests.jsonl		(one request per line, with its "op"; one reply per line, in order)
+#	(--socket path; default $METMODEL_SOCKET, or metmodeld.<uid>.sock in the temp directory, as for modeld.py)
+#from Python:
+#	c = modelclient.client()
+#	c.solve('cthmodel', knockouts=['R_PFL'], fluxes=['R_EXCH_etoh_e'])['objective']
+
+import os, sys, json, socket, tempfile		#standard Python modules
+from optparse import OptionParser			#standard Python module
+
+
+def default_socket ():
+	#socket path used by modeld.py and this client unless told otherwise
+	return os.environ.get('METMODEL_SOCKET') or os.path.join(tempfile.gettempdir(), 'metmodeld.%d.sock' % (os.getuid()))
+
+
+class client:
+	"Connection to a running modeld.py. Each method sends one request and returns the reply (dict); ValueError if the daemon could not carry it out."
+
+	def __init__ (self, path=None):
+		self.path = path or default_socket()
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.connect(self.path)
+		self.rfile = self.sock.makefile('rb')
+
+
+	def send (self, line):
+		#one request line (JSON text) -> its reply line (JSON text)
+		self.sock.sendall(line.rstrip('\n') + '\n')
+		reply = self.rfile.readline()
+		if not reply:
+			raise IOError('modeld at %s closed the connection' % (self.path))
+		return reply.rstrip('\n')
+
+
+	def request (self, op, **fields):
+		fields['op'] = op
+		reply = json.loads(self.send(json.dumps(fields)))
+		if not reply.get('ok'):
+			raise ValueError(reply.get('error'))
+		return reply
+
+
+	def models (self):
+		return self.request('models')['models']
+
+
+	def load (self, model, filename, objective=None):
+		return self.request('load', model=model, file=filename, objective=objective)
+
+
+	def solve (self, model, **scenario):
+		"Solve with a scenario's changes (media, constraints, knockouts, objective, fluxes; see scenarios.py): {'status', 'objective', 'fluxes'}."
+		return self.request('solve', model=model, **scenario)
+
+
+	def knockout (self, model, targets):
+		"Knock out each reaction or gene in targets on its own: rows as from cb.single_deletions."
+		return self.request('knockout', model=model, targets=targets)['table']
+
+
+	def fva (self, model, reactions=None, fraction_of_optimum=1.0):
+		"{ reactionID : [minimum, maximum] } (None where a solve is not OPTIMAL)."
+		return self.request('fva', model=model, reactions=reactions, fraction_of_optimum=fraction_of_optimum)['ranges']
+
+
+	def fluxes (self, model, reactions=None):
+		"The model's wild type solution: {'status', 'objective', 'fluxes'} (reactions: the fluxes to report, default those carrying flux)."
+		return self.request('fluxes', model=model, reactions=reactions)
+
+
+	def shutdown (self):
+		return self.request('shutdown')
+
+
+	def close (self):
+		self.rfile.close()
+		self.sock.close()
+
+
+if __name__ == '__main__':
+	parser = OptionParser(usage="%prog [options] op ['{JSON fields}']  |  %prog [options] - < requests.jsonl")
+	parser.add_option('-s', '--socket', help='socket of the daemon (default: $METMODEL_SOCKET, or metmodeld.<uid>.sock in the temp directory)')
+	options, args = parser.parse_args()
+	if not 1 <= len(args) <= 2:
+		parser.error('give an op (and its fields as a JSON object), or - to read requests from standard input')
+
+	c = client(options.socket)
+	if args[0] == '-':
+		for line in iter(sys.stdin.readline, ''):
+			if line.strip():
+				print c.send(line)
+				sys.stdout.flush()
+		c.close()
+		sys.exit(0)
+
+	fields = {}
+	if len(args) == 2:
+		fields = json.loads(args[1])
+	fields['op'] = args[0]
+	reply = c.send(json.dumps(fields))
+	c.close()
+	print reply
+	if not json.loads(reply).get('ok'):
+		sys.exit(1)
@@ -0,0 +1,252 @@
+#script purpose: model daemon: keep models loaded, each with a warm solver session, and answer solve / knockout / fva / flux requests over a Unix domain socket
+#usage:
+#	python modeld.py [--socket path] [--objective R_BIOMASS] model_organisms/cthmodel.txt [ssa=model_organisms/ssamodel2.txt ...]
+#	(a model is named after its file, e.g. cthmodel, unless given as name=file; modelclient.py is the client)
+#protocol: one JSON object per line each way, any number of requests per connection, replies in request order.
+#every request has an "op"; every reply has "ok" (true, or false with an "error" message)
+#	{"op": "models"} -> {"models": {name: {"file", "objective", "reactions", "status", "objective_value"}}}
+#	{"op": "load", "model": "ssa", "file": "model_organisms/ssamodel2.txt", "objective": "R_BIOMASS"} (replaces a model of that name)
+#	{"op": "unload", "model": "ssa"}
+#	{"op": "solve", "model": "cthmodel", "media": ..., "constraints": ..., "knockouts": ..., "objective": ..., "fluxes": ...}
+#		-> {"id", "status", "objective", "fluxes"}: one scenario, as in scenarios.py; the model's bounds and objective are put back afterwards
+#	{"op": "knockout", "model": "cthmodel", "targets": ["R_PFL", "Cthe_0423"]} -> {"table": rows of cb.single_deletions, one per target}
+#	{"op": "fva", "model": "cthmodel", "reactions": [...], "fraction_of_optimum": 1.0} -> {"ranges": {reactionID: [minimum, maximum]}} (null: not OPTIMAL)
+#	{"op": "fluxes", "model": "cthmodel", "reactions": [...]} -> {"status", "objective", "fluxes"} of the wild type solution (no solve;
+#		default: the reactions carrying flux)
+#	{"op": "shutdown"}
+#each model has a lock: requests on one model run one at a time (they share its solver session), requests on different models run side by side
+#(their GLPK calls take turns, see solvers.GLPK_LOCK).
+
+import os, sys, json, errno, signal, socket, threading, SocketServer		#standard Python modules
+from optparse import OptionParser						#standard Python module
+import metmodelCLI, scenarios, modelclient				#custom Python modules
+
+
+def model_name (filename):
+	#default name of a model: its file name without directory or extension
+	return os.path.splitext(os.path.basename(filename))[0]
+
+
+def float_or_none (value):
+	#JSON has no nan
+	if value != value:
+		return None
+	return value
+
+
+class handler (SocketServer.StreamRequestHandler):
+	#one connection: answer request lines until the client closes it
+
+	def handle (self):
+		for line in iter(self.rfile.readline, ''):
+			if not line.strip():
+				continue
+			self.wfile.write(self.server.answer(line) + '\n')
+
+
+class daemon (SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	"Unix socket server holding models by name: { name : {'model', 'lock', 'file', 'wildtype'} }."
+
+	daemon_threads = True
+
+	def __init__ (self, path, objective='R_BIOMASS'):
+		self.path, self.objective = path, objective
+		self.models = {}
+		#guards self.models; each model has its own lock for the requests on it
+		self.lock = threading.Lock()
+		remove_stale_socket(path)
+		#only this user may connect
+		umask = os.umask(077)
+		try:
+			SocketServer.UnixStreamServer.__init__(self, path, handler)
+		finally:
+			os.umask(umask)
+
+
+	def load (self, name, filename, objective=None):
+		"Build a model from an mm2 file, solve its wild type (which starts its solver session) and serve it as 'name'."
+		m = metmodelCLI.cb()
+		m.build_from_mm2(filename, readquiet=True)
+		objective = objective or self.objective
+		if not objective in m.REACTIONS:
+			raise ValueError('objective %s is not in REACTIONS' % (objective))
+		m.set_objective('Maximize', objective)
+		m.solve(verbose=False)
+		wildtype = (m.STATUS, m.OBJECTIVE_VALUE, m.REACTION2FLUXVALUE.copy())
+		self.lock.acquire()
+		try:
+			self.models[name] = {'model':m, 'lock':threading.Lock(), 'file':filename, 'wildtype':wildtype}
+		finally:
+			self.lock.release()
+		print 'loaded %s from %s: %d reactions, %s %s' % (name, filename, len(m.REACTIONS), wildtype[0], wildtype[1])
+		sys.stdout.flush()
+
+
+	def entry (self, request):
+		#the model a request names
+		self.lock.acquire()
+		try:
+			name = request['model']
+			if not name in self.models:
+				raise ValueError('no model %s (loaded: %s)' % (name, ', '.join(sorted(self.models))))
+			return self.models[name]
+		finally:
+			self.lock.release()
+
+
+	def answer (self, line):
+		"Reply (JSON text) to one request line; errors come back as {'ok': false, 'error'} and leave the daemon running."
+		try:
+			request = json.loads(line)
+			op = request['op']
+			if not op in OPS:
+				raise ValueError('unknown op %s (ops: %s)' % (op, ', '.join(sorted(OPS))))
+			reply = OPS[op](self, request)
+			reply['ok'] = True
+		except Exception, error:
+			reply = {'ok':False, 'error':'%s: %s' % (error.__class__.__name__, error)}
+		return json.dumps(reply)
+
+
+def remove_stale_socket (path):
+	#remove a socket left behind by a daemon that is gone; refuse to start if one still answers there
+	if not os.path.exists(path):
+		return
+	probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	try:
+		try:
+			probe.connect(path)
+		except socket.error, error:
+			if error.args[0] in (errno.ECONNREFUSED, errno.ENOENT):
+				os.remove(path)
+				return
+			raise
+		raise IOError('a daemon is already serving %s' % (path))
+	finally:
+		probe.close()
+
+
+#::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+#request handlers: op(server, request) -> reply (dict)
+
+def op_models (server, request):
+	models = {}
+	for name, entry in server.models.items():
+		m = entry['model']
+		models[name] = {'file':entry['file'], 'objective':m.OBJECTIVE[1], 'reactions':len(m.REACTIONS),
+						'status':entry['wildtype'][0], 'objective_value':entry['wildtype'][1]}
+	return {'models':models}
+
+
+def op_load (server, request):
+	name = request['model']
+	server.load(name, request['file'], request.get('objective'))
+	return {'model':name}
+
+
+def op_unload (server, request):
+	entry = server.entry(request)
+	server.lock.acquire()
+	try:
+		del server.models[request['model']]
+	finally:
+		server.lock.release()
+	return {'model':request['model']}
+
+
+def op_solve (server, request):
+	entry = server.entry(request)
+	entry['lock'].acquire()
+	try:
+		result = scenarios.solve_scenario(entry['model'], request, request.get('id'))
+	finally:
+		entry['lock'].release()
+	if 'error' in result:
+		raise ValueError(result['error'])
+	if result['id'] is None:
+		del result['id']
+	return result
+
+
+def op_knockout (server, request):
+	entry = server.entry(request)
+	m = entry['model']
+	targets = request['targets']
+	for item in targets:
+		if not (item in m.REACTIONS or item in m.GENES):
+			raise ValueError('%s is not a reaction or gene of the model' % (item))
+	entry['lock'].acquire()
+	try:
+		table = m.single_deletions(targets, workers=1)
+	finally:
+		entry['lock'].release()
+	return {'table':table}
+
+
+def op_fva (server, request):
+	entry = server.entry(request)
+	m = entry['model']
+	reactions = request.get('reactions')
+	for r in reactions or []:
+		if not r in m.REACTIONS:
+			raise ValueError('%s is not in REACTIONS' % (r))
+	entry['lock'].acquire()
+	try:
+		ranges = m.fva(reactions, request.get('fraction_of_optimum', 1.0), workers=1)
+		index = m.S
+		if m.COMPRESSION:
+			index = m.COMPRESSION.full
+	finally:
+		entry['lock'].release()
+	if ranges is None:
+		raise ValueError('objective %s cannot be solved' % (m.OBJECTIVE[1]))
+	minimum, maximum = ranges
+	if reactions is None:
+		reactions = index.reactions
+	return {'ranges':dict([(r, [float_or_none(minimum[index.reaction2index[r]]), float_or_none(maximum[index.reaction2index[r]])]) for r in reactions])}
+
+
+def op_fluxes (server, request):
+	status, objectivevalue, reaction2fluxvalue = server.entry(request)['wildtype']
+	reactions = request.get('reactions')
+	if reactions is None:
+		fluxes = dict([(r, float(v)) for r, v in reaction2fluxvalue.items() if float(v) != 0])
+	else:
+		fluxes = dict([(r, float(reaction2fluxvalue[r])) for r in reactions if r in reaction2fluxvalue])
+	return {'status':status, 'objective':objectivevalue, 'fluxes':fluxes}
+
+
+def op_shutdown (server, request):
+	#serve_forever stops after this reply is written (shutdown waits for it, so it can't run in this thread)
+	threading.Thread(target=server.shutdown).start()
+	return {}
+
+
+OPS = {'models':op_models, 'load':op_load, 'unload':op_unload, 'solve':op_solve, 'knockout':op_knockout,
+		'fva':op_fva, 'fluxes':op_fluxes, 'shutdown':op_shutdown}
+
+
+if __name__ == '__main__':
+	parser = OptionParser(usage='%prog [options] [name=]mm2_model_file ...')
+	parser.add_option('-s', '--socket', help='socket to serve on (default: $METMODEL_SOCKET, or metmodeld.<uid>.sock in the temp directory)')
+	parser.add_option('--objective', default='R_BIOMASS', help='reaction maximized unless a load request says otherwise (default R_BIOMASS)')
+	options, args = parser.parse_args()
+
+	server = daemon(options.socket or modelclient.default_socket(), options.objective)
+	try:
+		for arg in args:
+			name, filename = None, arg
+			if '=' in arg:
+				name, filename = arg.split('=', 1)
+			server.load(name or model_name(filename), filename)
+		#SIGTERM stops the daemon as the shutdown op does
+		signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+		print 'serving %d models on %s' % (len(server.models), server.path)
+		sys.stdout.flush()
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+	finally:
+		server.server_close()
+		os.remove(server.path)
@@ -0,0 +1,39 @@
+#script purpose: throughput of eq_current.parse against eq_current.parse_split (original) on the model_organisms files
+
+import glob, time
+import eq_current
+
+#how many times to parse each file's equations with each parser (best time is reported)
+REPEATS = 5
+
+#equation column of every reaction line in the model files (mm2 downloads and .model.txt files)
+total = {'parse_split':0.0, 'parse':0.0, 'equations':0}
+for filename in sorted(glob.glob('model_organisms/*.txt')):
+	equations = []
+	for line in open(filename):
+		col = line.rstrip('\r\n').split('\t')
+		if line[:1] == 'R' and len(col) >= 6 and not 'R_ILL_' in col[0]:
+			equations.append(col[5])
+	if not equations:
+		continue
+
+	#both parsers must give the same result
+	assert eq_current.parse_all(equations) == [eq_current.parse_split(e) for e in equations], filename
+
+	times = {}
+	for name, parser in (('parse_split', lambda: [eq_current.parse_split(e) for e in equations]), ('parse', lambda: eq_current.parse_all(equations))):
+		best = None
+		for i in range(REPEATS):
+			start = time.time()
+			parser()
+			elapsed = time.time() - start
+			if best is None or elapsed < best:
+				best = elapsed
+		times[name] = best
+		total[name] += best
+	total['equations'] += len(equations)
+	print '%s\t%d equations\tparse_split %.0f/s\tparse %.0f/s\t%.1fx' % (filename, len(equations), len(equations) / times['parse_split'],
+				len(equations) / times['parse'], times['parse_split'] / times['parse'])
+
+print 'all\t%d equations\tparse_split %.0f/s\tparse %.0f/s\t%.1fx' % (total['equations'], total['equations'] / total['parse_split'],
+			total['equations'] / total['parse'], total['parse_split'] / total['parse'])
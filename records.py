@@ -0,0 +1,221 @@
+#script purpose: compact reaction and species records for metmodelCLI.cb (the values of REACTIONS and SPECIES)
+	#records are immutable (changing one means making a new record), so copies of a model share them
+	#uses only standard Python modules
+
+"""
+reaction record -> name, rev, notes, species, coefficients, tokens, reactants
+	notes is a tuple of interned note strings ('SUBSYSTEM: glycolysis', 'EC: 5.3.1.9', ...)
+	species is a tuple of interned species IDs, reactants first, then products; reactants = how many of them are reactants
+	coefficients is an array('d') of the stoichiometric coefficients, aligned to species (all positive, as written)
+	tokens holds the same coefficients as written in the model ('2', '0.0010', '4.58142E-4'), so equations are displayed and written out unchanged
+	a reaction record still unpacks like the tuple it replaces:
+		name, rev, notes, equation = REACTIONS[ID]
+	with notes as a { note : 1 } dictionary and equation as [[(reactant, coef), ...], [(product, coef), ...]] (coefficients as written);
+	both are new objects built from the record, so notes is read-only (changing it raises TypeError): use cb.add_note / cb.delete_note
+
+species record -> id, name, compartment, charge, boundaryCondition
+	read like the dictionary it replaces: SPECIES[ID]['compartment'], SPECIES[ID].get('charge'), SPECIES[ID].keys(), ...
+
+pack_reactions / pack_species turn a { ID : record } dictionary into plain values (tuples, strings, numbers) for the
+compiled model cache; unpack_reactions / unpack_species make the records again
+"""
+
+from array import array		#standard Python module
+
+
+def intern_string (string):
+	#interned copy of a byte string (unicode strings cannot be interned and are kept as they are)
+	if type(string) == type(''):
+		return intern(string)
+	return string
+
+
+#interned note strings: most notes ('EC: .', 'SUBSYSTEM: ExchangeFlux', ...) are shared by many reactions
+NOTES = {}
+
+
+def intern_note (note):
+	if not note in NOTES:
+		NOTES[note] = intern_string(note)
+	return NOTES[note]
+
+
+def coefficient_token (coef):
+	#a coefficient as written (numbers given instead of strings are written as makestring would)
+	if isinstance(coef, basestring):
+		return intern_string(coef)
+	return intern_string('%.12g' % coef)
+
+
+class frozen_notes (dict):
+	"The { note : 1 } dictionary a reaction record unpacks to; it is not the record's notes, so changing it is an error rather than lost."
+
+	def refuse (self, *args, **kwargs):
+		raise TypeError('notes unpacked from a reaction record are read-only: use cb.add_note / cb.delete_note')
+
+	__setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = refuse
+
+
+	def __reduce__ (self):
+		#copies and pickles are plain dictionaries
+		return (dict, (dict(self),))
+
+
+class reaction (object):
+	"Immutable reaction record: name, reversibility, notes and equation, with the equation held as species IDs, a float array and the coefficients as written."
+	__slots__ = ('name', 'rev', 'notes', 'species', 'coefficients', 'tokens', 'reactants')
+
+	def __init__ (self, name, rev, notes, equation):
+		#notes: a { note : 1 } dictionary or any iterable of notes; equation: [[(reactant, coef), ...], [(product, coef), ...]]
+		self.name = name
+		self.rev = rev
+		self.notes = tuple([intern_note(note) for note in notes])
+		self.species = tuple([intern_string(species) for species, coef in equation[0] + equation[1]])
+		self.coefficients = array('d', [float(coef) for species, coef in equation[0] + equation[1]])
+		self.tokens = tuple([coefficient_token(coef) for species, coef in equation[0] + equation[1]])
+		self.reactants = len(equation[0])
+
+
+	def equation (self):
+		#[[(reactant, coef), ...], [(product, coef), ...]], coefficients as written (strings); the floats are in self.coefficients
+		pairs = zip(self.species, self.tokens)
+		return [pairs[:self.reactants], pairs[self.reactants:]]
+
+
+	def with_notes (self, notes):
+		#a copy of this record with different notes
+		record = reaction.__new__(reaction)
+		record.name, record.rev, record.species, record.coefficients, record.tokens, record.reactants = self.name, self.rev, self.species, self.coefficients, self.tokens, self.reactants
+		record.notes = tuple([intern_note(note) for note in notes])
+		return record
+
+
+	def __iter__ (self):
+		return iter((self.name, self.rev, frozen_notes(dict.fromkeys(self.notes, 1)), self.equation()))
+
+
+	def __getstate__ (self):
+		#slotted records have no __dict__; this lets every pickle protocol save them
+		return (self.name, self.rev, self.notes, self.species, self.coefficients, self.tokens, self.reactants)
+
+
+	def __setstate__ (self, state):
+		self.name, self.rev, self.notes, self.species, self.coefficients, self.tokens, self.reactants = state
+
+
+	def __len__ (self):
+		return 4
+
+
+	def __getitem__ (self, i):
+		return tuple(self)[i]
+
+
+	def __copy__ (self):
+		return self
+
+
+	def __deepcopy__ (self, memo):
+		return self
+
+
+	def __repr__ (self):
+		return repr(tuple(self))
+
+
+class species (object):
+	"Immutable species record, read like a dictionary with keys id, name, compartment, charge, boundaryCondition."
+	__slots__ = ('id', 'name', 'compartment', 'charge', 'boundaryCondition')
+
+	def __init__ (self, id, name, compartment, charge, boundaryCondition):
+		self.id = intern_string(id)
+		self.name = name
+		self.compartment = intern_string(compartment)
+		self.charge = charge
+		self.boundaryCondition = intern_string(boundaryCondition)
+
+
+	def __getitem__ (self, key):
+		if not key in species.__slots__:
+			raise KeyError(key)
+		return getattr(self, key)
+
+
+	def get (self, key, default=None):
+		if not key in species.__slots__:
+			return default
+		return getattr(self, key)
+
+
+	def __contains__ (self, key):
+		return key in species.__slots__
+
+
+	def keys (self):
+		return list(species.__slots__)
+
+
+	def items (self):
+		return [(key, getattr(self, key)) for key in species.__slots__]
+
+
+	def __iter__ (self):
+		return iter(species.__slots__)
+
+
+	def __getstate__ (self):
+		return (self.id, self.name, self.compartment, self.charge, self.boundaryCondition)
+
+
+	def __setstate__ (self, state):
+		self.id, self.name, self.compartment, self.charge, self.boundaryCondition = state
+
+
+	def __len__ (self):
+		return len(species.__slots__)
+
+
+	def __copy__ (self):
+		return self
+
+
+	def __deepcopy__ (self, memo):
+		return self
+
+
+	def __repr__ (self):
+		return repr(dict(self.items()))
+
+
+def pack_reactions (reactions):
+	#{ reactionID : (name, rev, notes, species, coefficients as bytes, tokens, reactants) }
+	packed = {}
+	for ID, record in reactions.iteritems():
+		packed[ID] = (record.name, record.rev, record.notes, record.species, record.coefficients.tostring(), record.tokens, record.reactants)
+	return packed
+
+
+def unpack_reactions (packed):
+	reactions = {}
+	for ID, (name, rev, notes, species, coefficients, tokens, reactants) in packed.iteritems():
+		record = reaction.__new__(reaction)
+		record.name, record.rev, record.species, record.tokens, record.reactants = name, rev, species, tokens, reactants
+		record.notes = tuple([intern_note(note) for note in notes])
+		record.coefficients = array('d')
+		record.coefficients.fromstring(coefficients)
+		reactions[ID] = record
+	return reactions
+
+
+def pack_species (species_records):
+	#{ speciesID : (id, name, compartment, charge, boundaryCondition) }
+	return dict([(ID, record.__getstate__()) for ID, record in species_records.iteritems()])
+
+
+def unpack_species (packed):
+	species_records = {}
+	for ID, state in packed.iteritems():
+		record = species.__new__(species)
+		record.__setstate__(state)
+		species_records[ID] = record
+	return species_records
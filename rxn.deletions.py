@@ -22,40 +22,16 @@ m.solve(verbose=False)
 #print summary of wild type findings
 print 'wild type' + '\t' + str(m.OBJECTIVE_VALUE) + '\t' + call		
 
+targets = []
 for r in m.REACTIONS:
 	#don't bother testing exchanges, biomass rxns
 	if 'R_SRC' in r or 'R_ESC' in r or 'R_EXCH' in r or r == 'R_BIOMASS':		
 		continue
-	#lookup some information for this reaction
-	name, reversible, notes, rawequation = m.REACTIONS[r]	
-	#get the gpr for the reaction
-	gpr = m.get_notes(r, 'Gene_association: ')				
-	#get the reaction's subsystem (pathway(s))
-	subsystem = m.get_notes(r, 'SUBSYSTEM: ')		
-	#get the reaction equation		
-	equation = m.get_equation(r)							
-
-	#determine what 'default' upper and lower bounds are for each rxn
-	if reversible:	
-		#this is so you can reset these to default values after 'deleting' this rxn						
-		default_lowerbound = -1000			
-	else:
-		default_lowerbound = 0
-	default_upperbound = 1000
-	
-	#now delete this rxn by constraining it to zero flux
-	m.set_constraint(r, 0, 0)				
-	#solve the model
-	m.solve(verbose=False)		
-	#determine whether it's lethal or nonlethal by the objective value (biomass flux)			
-	if float(m.OBJECTIVE_VALUE) < 1e-10:	
-		call = 'lethal'
-	else:
-		call = 'nonlethal'
-		
-	#print results for this reaction	
-	print r + '\t' + str(m.OBJECTIVE_VALUE) + '\t' + call + '\t' + gpr + '\t' + subsystem + '\t' + equation	
-	
-	#reset default upper and lower bounds, move to next rxn
-	m.set_constraint(r, default_lowerbound, default_upperbound)		
-		
\ No newline at end of file
+	targets.append(r)
+
+#delete each rxn by constraining it to zero flux and solve, splitting the rxns across one worker process per core (workers=None);
+#a deletion is 'lethal' if the objective value (biomass flux) drops below 1e-10
+table = m.single_deletions(targets, workers=None, threshold=1e-10)
+
+#print results for each reaction: id, objective value, call, gpr, subsystem (pathway(s)), reaction equation
+m.print_deletions(table)
@@ -0,0 +1,129 @@
+#script purpose: flux sampling for metmodelCLI.cb.sample: artificial centering hit-and-run (ACHR) chains writing into a memory-mapped file
+	#uses only standard Python modules (the steps are plain Python lists; sampling a compressed model keeps them short)
+
+"""
+sample file -> n rows of 8 byte floats (native byte order), one column per reaction; row i is sample i
+<sample file>.reactions -> the reactionIDs of the columns, one per line
+
+A chain starts at the center of the warmup points (LP optima at the extremes of each reaction's flux), all of which satisfy
+S * v = 0 within the bounds. Each step picks a warmup point, moves along the line from the current center through it
+(a direction inside the null space of S) to a uniformly random point between the bounds, and moves the center toward the
+new point. Every 'thinning'-th point is written.
+"""
+
+import os, mmap, math, random			#standard Python modules
+from array import array					#standard Python module
+
+#direction components smaller than this are taken as 0 (warmup points that agree on a fixed reaction differ by round-off)
+TOLERANCE = 1e-9
+
+
+def create (filename, reactions, n):
+	#make an n-sample file (zeros) and its list of reactions, ready for chains to fill
+	listfile = open(filename + '.reactions', 'w')
+	for r in reactions:
+		print >>listfile, r
+	listfile.close()
+	outfile = open(filename, 'wb')
+	outfile.truncate(n * 8 * len(reactions))
+	outfile.close()
+
+
+def expanded (x, expansion):
+	#sample over the LP columns -> sample over the reactions: expansion is [(column, factor), ...] per reaction (column -1: flux 0)
+	if expansion is None:
+		return array('d', x)
+	return array('d', [column >= 0 and factor * x[column] or 0.0 for column, factor in expansion])
+
+
+def chain (warmup, lb, ub, first, n, thinning, seed, filename, expansion=None):
+	"Run one ACHR chain over warmup points and bounds lb / ub, writing samples first .. first + n - 1 of the sample file. Returns the number of steps taken."
+	rng = random.Random(seed)
+	k = len(warmup)
+	center = [sum(values) / k for values in zip(*warmup)]
+	x = list(center)
+	count = k
+	steps = 0
+	if n <= 0:
+		return steps
+
+	samplefile = open(filename, 'r+b')
+	samplemap = mmap.mmap(samplefile.fileno(), 0)
+	try:
+		for i in range(first, first + n):
+			for step in range(thinning):
+				steps += 1
+				#direction: from the center toward a random warmup point
+				u = [w - c for w, c in zip(warmup[rng.randrange(k)], center)]
+				norm = math.sqrt(sum([uj * uj for uj in u]))
+				if norm < TOLERANCE:
+					continue
+				u = [uj / norm for uj in u]
+				#furthest the line can go each way inside lb <= x + t * u <= ub
+				moving = [(uj, xj, lj, hj) for uj, xj, lj, hj in zip(u, x, lb, ub) if abs(uj) > TOLERANCE]
+				tmax = min([(hj - xj) / uj for uj, xj, lj, hj in moving if uj > 0] + [(lj - xj) / uj for uj, xj, lj, hj in moving if uj < 0])
+				tmin = max([(lj - xj) / uj for uj, xj, lj, hj in moving if uj > 0] + [(hj - xj) / uj for uj, xj, lj, hj in moving if uj < 0])
+				if tmin > tmax:
+					#x has drifted out of the bounds by round-off along this direction; stay put
+					continue
+				t = rng.uniform(tmin, tmax)
+				x = [xj + t * uj for xj, uj in zip(x, u)]
+				#the center follows the points visited
+				count += 1
+				center = [c + (xj - c) / count for c, xj in zip(center, x)]
+			row = expanded(x, expansion)
+			rowbytes = len(row) * 8
+			samplemap[i * rowbytes:(i + 1) * rowbytes] = row.tostring()
+		samplemap.flush()
+	finally:
+		samplemap.close()
+		samplefile.close()
+	return steps
+
+
+class samples:
+	"Flux samples read through a memory map: samples[i] is sample i (an array aligned to reactions), column(reactionID) one reaction across samples."
+
+	def __init__ (self, filename):
+		self.filename = filename
+		self.reactions = [line.strip() for line in open(filename + '.reactions') if line.strip()]
+		self.reaction2index = dict([(r, j) for j, r in enumerate(self.reactions)])
+		self.rowbytes = 8 * len(self.reactions)
+		self.file = open(filename, 'rb')
+		self.map = None
+		if os.path.getsize(filename):
+			self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+	def __len__ (self):
+		if not self.map or not self.rowbytes:
+			return 0
+		return len(self.map) // self.rowbytes
+
+
+	def __getitem__ (self, i):
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError('sample %d out of range' % (i))
+		return array('d', self.map[i * self.rowbytes:(i + 1) * self.rowbytes])
+
+
+	def __iter__ (self):
+		for i in range(len(self)):
+			yield self[i]
+
+
+	def column (self, reaction):
+		"Flux through one reaction in every sample, as an array."
+		j = self.reaction2index[reaction]
+		values = array('d')
+		for i in range(len(self)):
+			values.fromstring(self.map[i * self.rowbytes + 8 * j:i * self.rowbytes + 8 * j + 8])
+		return values
+
+
+	def close (self):
+		if self.map:
+			self.map.close()
+		self.file.close()
@@ -0,0 +1,228 @@
+#script purpose: run a stream of scenarios (media, constraint overrides, knockouts, objective) against one model, one JSON result line per scenario
+#usage:
+#	python scenarios.py model_organisms/cthmodel.txt scenarios.jsonl [-o results.jsonl] [--workers 4] [--objective R_BIOMASS]
+#	(scenarios file '-' reads standard input; results go to standard output unless -o is given)
+#one scenario per line, a JSON object; every key is optional:
+#	{"id": "cb10", "media": {"cellobiose[e]": [-10, 0], "cellulose[e]": [0, 0]}, "constraints": {"R_PFL": [0, 0]},
+#	 "knockouts": ["R_ALCD2x", "Cthe_0423"], "objective": ["Maximize", "R_BIOMASS"], "fluxes": ["R_EXCH_etoh_e"]}
+#	media: exchange bounds by metabolite, as in an exchanges file ('cellobiose[e]' or 'M_cellobiose_e'), or the name of an exchanges file
+#	constraints: reaction bounds; knockouts: reactions or genes (a gene knocks out the reactions its gprs lose)
+#	objective: a reactionID (maximized) or [goal, reactionID]; fluxes: reactionIDs to report, or true for every reaction carrying flux
+#one result per line, in the order scenarios finish: {"id", "status", "objective", "fluxes"}, or {"id", "error"} if a scenario can't be run
+#	(id defaults to the scenario's line number)
+#the model is loaded once; each worker keeps its own copy and solver session, so every scenario re-solves from the previous one's basis
+#and puts its changes back afterwards. At most a few scenarios per worker are read ahead, so memory stays flat however long the stream is.
+
+import sys, json, Queue, threading, multiprocessing		#standard Python modules
+from optparse import OptionParser					#standard Python module
+import metmodelCLI, eq_current						#custom Python modules
+
+#media files read so far (per process), by filename
+MEDIA = {}
+
+
+def exchange_reaction (metabolite):
+	#exchange reactionID for a metabolite given as in an exchanges file ('cellobiose[e]') or as a speciesID ('M_cellobiose_e')
+	if not metabolite.startswith('M_'):
+		metabolite = eq_current.convert_metabolite_ext2int(metabolite)
+	return 'R_EXCH_' + metabolite[2:]
+
+
+def read_media (model, filename):
+	#{ metabolite : (lb, ub) } from an exchanges file, each line read as the model's exchanges reader does (missing bounds are -1000, 1000)
+	if not filename in MEDIA:
+		media = {}
+		for line in open(filename):
+			line = line.rstrip()
+			if line and not line[0] == '#':
+				met, lb, ub = model.read_exchange(line, True)
+				media[met] = (lb, ub)
+		MEDIA[filename] = media
+	return MEDIA[filename]
+
+
+def float_bounds (bounds):
+	#(lb, ub) as floats; raises ValueError if that is not what they are
+	lbound, ubound = bounds
+	return float(lbound), float(ubound)
+
+
+def bounds_of (scenario, model):
+	#{ reactionID : (lb, ub) } the scenario sets, media first, then constraints, then knockouts; raises ValueError for unknown names
+	bounds = {}
+	media = scenario.get('media', {})
+	if isinstance(media, basestring):
+		media = read_media(model, media)
+	for metabolite in media:
+		r = exchange_reaction(metabolite)
+		if not r in model.REACTIONS:
+			raise ValueError('no exchange reaction %s for %s' % (r, metabolite))
+		bounds[r] = float_bounds(media[metabolite])
+	constraints = scenario.get('constraints', {})
+	for r in constraints:
+		if not r in model.REACTIONS:
+			raise ValueError('%s is not in REACTIONS' % (r))
+		bounds[r] = float_bounds(constraints[r])
+	for item in scenario.get('knockouts', []):
+		if not (item in model.REACTIONS or item in model.GENES):
+			raise ValueError('%s is not a reaction or gene of the model' % (item))
+		for r in model.deleted_reactions(item):
+			bounds[r] = (0, 0)
+	return bounds
+
+
+def solve_scenario (model, scenario, number=None):
+	"Run one scenario (a dict, as read from a line) on a model, putting its constraints and objective back afterwards; returns the result (dict)."
+	result = {'id':number}
+	try:
+		result['id'] = scenario.get('id', number)
+		bounds = bounds_of(scenario, model)
+		objective = scenario.get('objective', model.OBJECTIVE[1])
+		if isinstance(objective, basestring):
+			objective = ('Maximize', objective)
+		if not objective[1] in model.REACTIONS:
+			raise ValueError('objective %s is not in REACTIONS' % (objective[1]))
+	except (ValueError, TypeError, KeyError, IndexError, AttributeError, IOError), error:
+		result['error'] = str(error)
+		return result
+
+	saved_objective = model.OBJECTIVE
+	saved = [(r, model.CONSTRAINTS.get(r)) for r in bounds]
+	try:
+		for r in bounds:
+			model.set_constraint(r, bounds[r][0], bounds[r][1])
+		model.set_objective(objective[0], objective[1])
+		model.solve(verbose=False, duals=False)
+		result['status'], result['objective'] = model.STATUS, model.OBJECTIVE_VALUE
+		fluxes = scenario.get('fluxes')
+		if fluxes is True:
+			result['fluxes'] = dict([(r, float(v)) for r, v in model.REACTION2FLUXVALUE.items() if float(v) != 0])
+		elif fluxes:
+			result['fluxes'] = dict([(r, float(model.REACTION2FLUXVALUE[r])) for r in fluxes if r in model.REACTION2FLUXVALUE])
+	finally:
+		for r, constraint in saved:
+			model.restore_constraint(r, constraint)
+		model.set_objective(saved_objective[0], saved_objective[1])
+	return result
+
+
+def run_scenario (model, task):
+	"Run one scenario (line number, JSON text) on a model; returns the result line (JSON text)."
+	number, line = task
+	try:
+		scenario = json.loads(line)
+	except ValueError, error:
+		return json.dumps({'id':number, 'error':str(error)})
+	return json.dumps(solve_scenario(model, scenario, number))
+
+
+def read_scenarios (infile, window):
+	#(line number, line) for each scenario; blocks while 'window' scenarios are in flight, so the pool never reads far ahead
+	number = 0
+	#readline, not iteration, so scenarios piped in are run as they arrive
+	for line in iter(infile.readline, ''):
+		number += 1
+		if not line.strip() or line.lstrip()[0] == '#':
+			continue
+		window.acquire()
+		yield number, line
+
+
+class feeder:
+	"Scenarios for the pool's task handler, read by a thread of its own; stop() ends them even while that thread is blocked (on the window or on input)."
+
+	def __init__ (self, infile, window):
+		self.queue = Queue.Queue()
+		self.error = None
+		thread = threading.Thread(target=self.read, args=(infile, window))
+		thread.daemon = True
+		thread.start()
+
+
+	def read (self, infile, window):
+		try:
+			try:
+				for task in read_scenarios(infile, window):
+					self.queue.put(task)
+			except Exception, error:
+				self.error = error
+		finally:
+			self.queue.put(None)
+
+
+	def __iter__ (self):
+		#the pool's task handler blocks here, on the queue, so pool.terminate() can always join it once stop() is called
+		for task in iter(self.queue.get, None):
+			yield task
+		if self.error:
+			raise self.error
+
+
+	def stop (self):
+		self.queue.put(None)
+
+
+def run (model, infile, outfile, workers=1, chunksize=8):
+	"Run every scenario read from infile, writing a result line to outfile as each finishes; returns the number of scenarios run."
+	count = 0
+	if workers <= 1:
+		window = threading.BoundedSemaphore(1)
+		for task in read_scenarios(infile, window):
+			print >>outfile, run_scenario(model, task)
+			outfile.flush()
+			window.release()
+			count += 1
+		return count
+	#the task feeder thread of the pool stops once this many scenarios are read and not yet written
+	window = threading.BoundedSemaphore(4 * workers * chunksize)
+	pool = multiprocessing.Pool(workers, metmodelCLI.init_worker, (model, run_scenario))
+	tasks = feeder(infile, window)
+	try:
+		for line in pool.imap_unordered(metmodelCLI.run_worker, iter(tasks), chunksize):
+			print >>outfile, line
+			outfile.flush()
+			window.release()
+			count += 1
+		pool.close()
+	except:
+		#e.g. Ctrl-C or an error writing outfile: end the task stream first, or terminate would wait for a reader blocked on the window
+		tasks.stop()
+		pool.terminate()
+		raise
+	pool.join()
+	return count
+
+
+if __name__ == '__main__':
+	parser = OptionParser(usage='%prog [options] mm2_model_file scenarios.jsonl')
+	parser.add_option('-o', '--out', help='write the result lines to this file (default: standard output)')
+	parser.add_option('--workers', type='int', default=1, help='worker processes (0 = one per core; default 1)')
+	parser.add_option('--chunksize', type='int', default=8, help='scenarios handed to a worker at a time (default 8)')
+	parser.add_option('--objective', default='R_BIOMASS', help='reaction maximized unless a scenario says otherwise (default R_BIOMASS)')
+	parser.add_option('--solver', help="LP backend: 'glpk' or 'glpsol' (default: the model's default)")
+	options, args = parser.parse_args()
+	if len(args) != 2:
+		parser.error('give the model file and the scenarios file')
+
+	#results are the only thing written to the output; anything the model code prints goes to standard error
+	outfile = sys.stdout
+	if options.out:
+		outfile = open(options.out, 'w')
+	sys.stdout = sys.stderr
+
+	m = metmodelCLI.cb()
+	m.build_from_mm2(args[0], readquiet=True)
+	m.set_objective('Maximize', options.objective)
+	if options.solver:
+		m.set_solver(options.solver)
+	#the wild type solve adds default escapes if the model has none, and gives every worker copy a session to start from
+	m.solve(verbose=False)
+
+	infile = sys.stdin
+	if args[1] != '-':
+		infile = open(args[1])
+	workers = options.workers or multiprocessing.cpu_count()
+	count = run(m, infile, outfile, workers, options.chunksize)
+	print >>sys.stderr, '%d scenarios' % (count)
+	if options.out:
+		outfile.close()
@@ -0,0 +1,622 @@
+#script purpose: LP solver backends used by metmodelCLI.cb.solve
+	#'glpk' builds the LP in memory from the model's compiled matrix (model.S) and solves it in-process with the GLPK shared library (loaded with ctypes, a standard module)
+	#'glpsol' writes an *.lp file and runs the glpsol executable, then parses its report (original method, kept as a fallback)
+
+"""
+A backend is a class with a solve method:
+
+	status, objectivevalue, reaction2fluxvalue, reaction2reducedcost, species2shadowprice = backend.solve(model, lpfilename=None, reportfilename=None, duals=True)
+
+status is the word glpsol puts on its 'Status:' line ('OPTIMAL', 'INFEASIBLE', 'UNBOUNDED', 'UNDEFINED', ...),
+objectivevalue is a float and reaction2fluxvalue is { reactionID : fluxvalue }, with flux values as strings, the way glpsol prints them.
+reaction2reducedcost is { reactionID : reduced cost } (the column duals) and species2shadowprice is { speciesID : shadow price }
+(the duals of the mass balance rows), as strings in the same format. With duals=False a backend may leave these two empty
+('glpk' does, since reading them back costs as much as a warm re-solve; 'glpsol' reads them in the same pass as the fluxes anyway).
+If lpfilename / reportfilename are given, the *.lp file and the glpsol style report are written to those files and kept.
+"""
+
+import os, time, shutil, hashlib, tempfile, threading, subprocess, ctypes, ctypes.util		#standard Python modules
+from collections import OrderedDict			#standard Python module
+from array import array					#standard Python module
+
+
+#GLPK constants (from glpk.h)
+GLP_MIN, GLP_MAX = 1, 2
+GLP_FR, GLP_LO, GLP_UP, GLP_DB, GLP_FX = 1, 2, 3, 4, 5
+GLP_OFF, GLP_ON = 0, 1
+GLP_PRIMAL, GLP_DUALP, GLP_DUAL = 1, 2, 3
+GLP_SF_AUTO = 0x80
+GLP_BV = 3
+
+#glp_get_status codes -> status words printed by glpsol
+GLP_OPT = 5
+GLPK_STATUS = {1:'UNDEFINED', 2:'FEASIBLE', 3:'INFEASIBLE', 4:'INFEASIBLE', 5:'OPTIMAL', 6:'UNBOUNDED'}
+
+
+def load_glpk ():
+	#find and load the GLPK shared library; returns None if it isn't installed
+	names = [ctypes.util.find_library('glpk'), 'libglpk.so', 'libglpk.dylib', 'glpk.dll']
+	for name in names:
+		if not name:
+			continue
+		try:
+			lib = ctypes.CDLL(name)
+		except OSError:
+			continue
+		c_int, c_double, c_void_p, c_char_p = ctypes.c_int, ctypes.c_double, ctypes.c_void_p, ctypes.c_char_p
+		prototypes = {
+			'glp_create_prob':(c_void_p, []),
+			'glp_delete_prob':(None, [c_void_p]),
+			'glp_set_obj_name':(None, [c_void_p, c_char_p]),
+			'glp_set_obj_dir':(None, [c_void_p, c_int]),
+			'glp_add_rows':(c_int, [c_void_p, c_int]),
+			'glp_add_cols':(c_int, [c_void_p, c_int]),
+			'glp_set_row_name':(None, [c_void_p, c_int, c_char_p]),
+			'glp_set_col_name':(None, [c_void_p, c_int, c_char_p]),
+			'glp_set_row_bnds':(None, [c_void_p, c_int, c_int, c_double, c_double]),
+			'glp_set_col_bnds':(None, [c_void_p, c_int, c_int, c_double, c_double]),
+			'glp_set_obj_coef':(None, [c_void_p, c_int, c_double]),
+			'glp_load_matrix':(None, [c_void_p, c_int, c_void_p, c_void_p, c_void_p]),
+			'glp_scale_prob':(None, [c_void_p, c_int]),
+			'glp_adv_basis':(None, [c_void_p, c_int]),
+			'glp_init_smcp':(None, [c_void_p]),
+			'glp_simplex':(c_int, [c_void_p, c_void_p]),
+			'glp_get_status':(c_int, [c_void_p]),
+			'glp_get_obj_val':(c_double, [c_void_p]),
+			'glp_get_col_prim':(c_double, [c_void_p, c_int]),
+			'glp_get_col_dual':(c_double, [c_void_p, c_int]),
+			'glp_get_row_dual':(c_double, [c_void_p, c_int]),
+			'glp_print_sol':(c_int, [c_void_p, c_char_p]),
+			'glp_set_mat_row':(None, [c_void_p, c_int, c_int, c_void_p, c_void_p]),
+			'glp_set_col_kind':(None, [c_void_p, c_int, c_int]),
+			'glp_init_iocp':(None, [c_void_p]),
+			'glp_intopt':(c_int, [c_void_p, c_void_p]),
+			'glp_mip_status':(c_int, [c_void_p]),
+			'glp_mip_col_val':(c_double, [c_void_p, c_int]),
+			'glp_term_out':(c_int, [c_int]),
+		}
+		for function in prototypes:
+			restype, argtypes = prototypes[function]
+			getattr(lib, function).restype = restype
+			getattr(lib, function).argtypes = argtypes
+		#keep GLPK quiet; glpsol's terminal output used to go to glpsol.log
+		lib.glp_term_out(GLP_OFF)
+		return lib
+	return None
+
+GLPK = load_glpk()
+
+#GLPK keeps library wide state (its environment, output buffers), so calls into it from several threads at once corrupt each other;
+#every use of the library holds this lock (reentrant: a session freed by the garbage collector may close while it is held)
+GLPK_LOCK = threading.RLock()
+
+
+class smcp (ctypes.Structure):
+	#glp_smcp, simplex control parameters; only the leading members are named, the rest is room for the reserved fields
+	_fields_ = [('msg_lev', ctypes.c_int), ('meth', ctypes.c_int), ('pricing', ctypes.c_int), ('r_test', ctypes.c_int),
+				('tol_bnd', ctypes.c_double), ('tol_dj', ctypes.c_double), ('tol_piv', ctypes.c_double),
+				('obj_ll', ctypes.c_double), ('obj_ul', ctypes.c_double),
+				('it_lim', ctypes.c_int), ('tm_lim', ctypes.c_int), ('out_frq', ctypes.c_int), ('out_dly', ctypes.c_int),
+				('presolve', ctypes.c_int), ('reserved', ctypes.c_double * 64)]
+
+
+class iocp (ctypes.Structure):
+	#glp_iocp, integer optimizer control parameters; only the leading members are named, the rest is room for the others
+	_fields_ = [('msg_lev', ctypes.c_int), ('br_tech', ctypes.c_int), ('bt_tech', ctypes.c_int),
+				('tol_int', ctypes.c_double), ('tol_obj', ctypes.c_double),
+				('tm_lim', ctypes.c_int), ('out_frq', ctypes.c_int), ('out_dly', ctypes.c_int),
+				('cb_func', ctypes.c_void_p), ('cb_info', ctypes.c_void_p), ('cb_size', ctypes.c_int),
+				('pp_tech', ctypes.c_int), ('mip_gap', ctypes.c_double),
+				('mir_cuts', ctypes.c_int), ('gmi_cuts', ctypes.c_int), ('cov_cuts', ctypes.c_int), ('clq_cuts', ctypes.c_int),
+				('presolve', ctypes.c_int), ('reserved', ctypes.c_double * 64)]
+
+
+#GLPK's primal feasibility tolerance (glp_smcp.tol_bnd default): values smaller than this are round-off of the simplex, not flux
+ZERO_TOLERANCE = 1e-7
+
+
+def format_flux (value):
+	#format a flux value the way glpsol's report does ('%13.6g' without the padding), round-off below ZERO_TOLERANCE printed as 0
+	#(the in-process solver's warm starts leave round-off up to ~6e-8 where glpsol reports 0)
+	if abs(value) < ZERO_TOLERANCE:
+		return '0'
+	return '%.6g' % value
+
+
+def format_objective (value):
+	#objective value as glpsol's report gives it ('%.10g'), converted back to a float
+	return float('%.10g' % value)
+
+
+def raw_status (primal, dual):
+	#status word for the primal / dual solution states of a raw solution file ('u'ndefined, 'f'easible, 'i'nfeasible, 'n'o feasible),
+	#decided the way glp_get_status does
+	if primal == 'f':
+		if dual == 'f':
+			return 'OPTIMAL'
+		if dual == 'n':
+			return 'UNBOUNDED'
+		return 'FEASIBLE'
+	if primal in ('i', 'n'):
+		return 'INFEASIBLE'
+	return 'UNDEFINED'
+
+
+#solution states as numbers, in raw files from glpsol before GLPK 4.57
+RAW_STATES = {'1':'u', '2':'f', '3':'i', '4':'n'}
+
+
+def read_raw_solution (filename, rownames, colnames):
+	"""
+	Stream-parse a raw solution file written by glpsol -w (glp_write_sol) for an LP with the given rows and columns, in glpsol order.
+	Returns status, objectivevalue, colname2prim, colname2dual, rowname2dual (values formatted as by format_flux).
+	Reads both the current format ('s bas m n p d obj', then 'i row st prim dual' and 'j col st prim dual' lines)
+	and the older one (m n / p d obj / one 'st prim dual' line per row, then per column).
+	"""
+	status, objectivevalue = 'UNDEFINED', ''
+	colprims, colduals, rowduals = {}, {}, {}
+	file = open(filename)
+	old, i = False, 0
+	for line in file:
+		kind = line[:1]
+		if kind == 'j':
+			col = line.split()
+			ID = colnames[int(col[1]) - 1]
+			colprims[ID], colduals[ID] = format_flux(float(col[3])), format_flux(float(col[4]))
+		elif kind == 'i':
+			col = line.split()
+			rowduals[rownames[int(col[1]) - 1]] = format_flux(float(col[4]))
+		elif kind == 's':
+			col = line.split()
+			if col[1] == 'bas':
+				status, objectivevalue = raw_status(col[4], col[5]), format_objective(float(col[6]))
+		elif kind.isdigit() or kind == '-':
+			#older format: line position tells what a line is
+			col = line.split()
+			if i == 0:
+				old = True
+			elif i == 1 and old:
+				status, objectivevalue = raw_status(RAW_STATES.get(col[0]), RAW_STATES.get(col[1])), format_objective(float(col[2]))
+			elif old and i - 2 < len(rownames):
+				rowduals[rownames[i - 2]] = format_flux(float(col[2]))
+			elif old and i - 2 - len(rownames) < len(colnames):
+				ID = colnames[i - 2 - len(rownames)]
+				colprims[ID], colduals[ID] = format_flux(float(col[1])), format_flux(float(col[2]))
+			i += 1
+	file.close()
+	return status, objectivevalue, colprims, colduals, rowduals
+
+
+def bounds_type (lbound, ubound):
+	#GLPK bound type for a double bounded variable
+	if lbound == ubound:
+		return GLP_FX
+	return GLP_DB
+
+
+#::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::::
+
+
+class glpk_session:
+	"""
+	Persistent in-process LP for one model. The problem is built once from the model's compiled matrix (model.S) and kept, together with the last basis.
+	While no reactions are added or deleted, a new solve only pushes the bounds listed in model.CHANGED_BOUNDS (and the objective, if it
+	changed) and re-optimizes from the previous basis: dual simplex after bound changes, primal simplex after an objective change.
+	"""
+
+	def __init__ (self):
+		self.lp = None
+		self.revision = None
+		self.reactions = []
+		self.reaction2col = {}
+		self.rowspecies = []
+		self.objective = None
+
+
+	def __del__ (self):
+		self.close()
+
+
+	def close (self):
+		#free the GLPK problem
+		if self.lp and GLPK:
+			GLPK_LOCK.acquire()
+			try:
+				GLPK.glp_delete_prob(self.lp)
+			finally:
+				GLPK_LOCK.release()
+		self.lp = None
+
+
+	def current (self, model):
+		#True if the stored problem still has the model's reactions (i.e., only bounds / objective may have changed)
+		return self.lp and self.revision == model.REVISION and len(self.reactions) == len(model.S.reactions)
+
+
+	def build (self, model):
+		#build the problem from scratch, from the model's compiled stoichiometric matrix (model.S)
+		self.close()
+		S = model.S
+		lp = GLPK.glp_create_prob()
+		self.lp = lp
+		self.revision = model.REVISION
+		self.reactions = list(S.reactions)
+		self.reaction2col = {}
+		reaction2col = self.reaction2col
+
+		#one column per reaction, bounded by S.lb / S.ub (CONSTRAINTS, or VMAX and reaction reversibility)
+		GLPK.glp_add_cols(lp, len(self.reactions))
+		for j, ID in enumerate(self.reactions):
+			reaction2col[ID] = j + 1
+			GLPK.glp_set_col_name(lp, j + 1, ID)
+			lbound, ubound = S.lb[j], S.ub[j]
+			GLPK.glp_set_col_bnds(lp, j + 1, bounds_type(lbound, ubound), lbound, ubound)
+
+		#one mass balance row per (non-boundary) metabolite that takes part in a reaction; this is "S * v = 0"
+		indptr, cols, coefs = S.csr()
+		rows = [i for i in range(len(S.metabolites)) if S.balanced[i] and indptr[i] < indptr[i + 1]]
+		self.rowspecies = [S.metabolites[i] for i in rows]
+		if rows:
+			GLPK.glp_add_rows(lp, len(rows))
+		ne = 0
+		for row, i in enumerate(rows):
+			GLPK.glp_set_row_name(lp, row + 1, S.metabolites[i])
+			GLPK.glp_set_row_bnds(lp, row + 1, GLP_FX, 0.0, 0.0)
+			ne += indptr[i + 1] - indptr[i]
+
+		#glp_load_matrix takes 1-based arrays (element 0 is ignored)
+		ia, ja, ar = (ctypes.c_int * (ne + 1))(), (ctypes.c_int * (ne + 1))(), (ctypes.c_double * (ne + 1))()
+		k = 1
+		for row, i in enumerate(rows):
+			for n in range(indptr[i], indptr[i + 1]):
+				ia[k], ja[k], ar[k] = row + 1, cols[n] + 1, coefs[n]
+				k += 1
+		GLPK.glp_load_matrix(lp, ne, ia, ja, ar)
+
+		GLPK.glp_set_obj_name(lp, 'Z')
+		self.objective = None
+		self.set_objective(model)
+
+		#scale the problem and start from an advanced basis, as glpsol does
+		GLPK.glp_scale_prob(lp, GLP_SF_AUTO)
+		GLPK.glp_adv_basis(lp, 0)
+		model.CHANGED_BOUNDS = {}
+
+
+	def set_bounds (self, model, ID):
+		#push the bounds in effect for one reaction (from model.S) into the problem
+		lbound, ubound = model.S.bounds(ID)
+		GLPK.glp_set_col_bnds(self.lp, self.reaction2col[ID], bounds_type(lbound, ubound), lbound, ubound)
+
+
+	def set_objective (self, model):
+		#point the objective at model.OBJECTIVE; returns True if it changed
+		if self.objective == model.OBJECTIVE:
+			return False
+		assert model.OBJECTIVE[1], 'No objective has been defined.'
+		if self.objective and self.objective[1] in self.reaction2col:
+			GLPK.glp_set_obj_coef(self.lp, self.reaction2col[self.objective[1]], 0.0)
+		if model.OBJECTIVE[0].lower().startswith('max'):
+			GLPK.glp_set_obj_dir(self.lp, GLP_MAX)
+		else:
+			GLPK.glp_set_obj_dir(self.lp, GLP_MIN)
+		if model.OBJECTIVE[1] in self.reaction2col:
+			GLPK.glp_set_obj_coef(self.lp, self.reaction2col[model.OBJECTIVE[1]], 1.0)
+		else:
+			print
+			print '!! Warning:', model.OBJECTIVE[1], 'is not a reaction in the model !!'
+			print
+		self.objective = model.OBJECTIVE
+		return True
+
+
+	def update (self, model):
+		#bring the stored problem up to date with the model; returns the simplex method to re-optimize with
+		#an objective change keeps the basis primal feasible
+		self.set_objective(model)
+		method = GLP_PRIMAL
+		if model.CHANGED_BOUNDS:
+			for ID in model.CHANGED_BOUNDS:
+				if ID in self.reaction2col:
+					self.set_bounds(model, ID)
+			model.CHANGED_BOUNDS = {}
+			#bound changes keep the basis dual feasible; GLP_DUALP falls back to primal if it is not (e.g., objective changed too)
+			method = GLP_DUALP
+		return method
+
+
+	def simplex (self, method):
+		#run the simplex method from the current basis; returns glp_simplex's return code
+		parm = smcp()
+		GLPK.glp_init_smcp(ctypes.byref(parm))
+		parm.msg_lev = 0
+		parm.meth = method
+		return GLPK.glp_simplex(self.lp, ctypes.byref(parm))
+
+
+	def solve (self, model, lpfilename=None, reportfilename=None, duals=True):
+		stats = model.STATS
+		if lpfilename:
+			model.write_lp(lpfilename)
+			if stats:
+				stats.lap('write')
+				stats.count('bytes_written', os.path.getsize(lpfilename))
+
+		warm = self.current(model)
+		if warm:
+			method = self.update(model)
+		else:
+			self.build(model)
+			method = GLP_PRIMAL
+		if stats:
+			stats.lap('build')
+			stats.count(warm and 'warm_starts' or 'builds')
+
+		failed = False
+		if self.simplex(method) != 0 or (warm and GLPK.glp_get_status(self.lp) != GLP_OPT):
+			#the warm start failed (e.g., singular basis) or ended without an optimum; these LPs are degenerate enough that
+			#the basis history can matter, so confirm from an advanced basis, as a cold solve would
+			GLPK.glp_adv_basis(self.lp, 0)
+			failed = self.simplex(GLP_PRIMAL) != 0
+		if stats:
+			stats.lap('run')
+		if failed:
+			#glp_simplex could not solve at all (e.g., GLP_EBOUND: a lower bound above its upper bound); the column values still
+			#in the problem are the last solve's, so report no solution, as glpsol does when it writes none
+			if stats:
+				stats.lap('parse')
+			return 'UNDEFINED', '', {}, {}, {}
+
+		lp, reaction2col = self.lp, self.reaction2col
+		status = GLPK_STATUS.get(GLPK.glp_get_status(lp), 'UNDEFINED')
+		objectivevalue = format_objective(GLPK.glp_get_obj_val(lp))
+		#columns are numbered in the order of self.reactions, rows in the order of self.rowspecies
+		get_col_prim, get_col_dual, get_row_dual = GLPK.glp_get_col_prim, GLPK.glp_get_col_dual, GLPK.glp_get_row_dual
+		cols, rows = range(1, len(self.reactions) + 1), range(1, len(self.rowspecies) + 1)
+		reaction2fluxvalue = dict(zip(self.reactions, [format_flux(get_col_prim(lp, j)) for j in cols]))
+		reaction2reducedcost, species2shadowprice = {}, {}
+		if duals:
+			reaction2reducedcost = dict(zip(self.reactions, [format_flux(get_col_dual(lp, j)) for j in cols]))
+			species2shadowprice = dict(zip(self.rowspecies, [format_flux(get_row_dual(lp, i)) for i in rows]))
+
+		if reportfilename:
+			GLPK.glp_print_sol(lp, reportfilename)
+		if stats:
+			stats.lap('parse')
+
+		return status, objectivevalue, reaction2fluxvalue, reaction2reducedcost, species2shadowprice
+
+
+	def primal (self):
+		#column values of the last solution, unrounded, in the order of self.reactions (model.S.reactions when the session is current)
+		get_col_prim = GLPK.glp_get_col_prim
+		GLPK_LOCK.acquire()
+		try:
+			return array('d', [get_col_prim(self.lp, j) for j in range(1, len(self.reactions) + 1)])
+		finally:
+			GLPK_LOCK.release()
+
+
+class glpk_backend:
+	"In-process backend: solves with the GLPK library through the model's persistent session (model.SESSION, a glpk_session)."
+
+	def solve (self, model, lpfilename=None, reportfilename=None, duals=True):
+		assert GLPK, 'GLPK shared library not found; use the glpsol backend instead.'
+		if model.SESSION is None:
+			model.SESSION = glpk_session()
+		GLPK_LOCK.acquire()
+		try:
+			return model.SESSION.solve(model, lpfilename, reportfilename, duals)
+		finally:
+			GLPK_LOCK.release()
+
+
+class glpsol_backend:
+	"Subprocess backend: writes an *.lp file, runs glpsol on it and reads glpsol's raw solution file (needs glpsol on the PATH)."
+
+	def solve (self, model, lpfilename=None, reportfilename=None, duals=True):
+		stats = model.STATS
+		#every solve works in its own private directory (deleted below), so solves in parallel threads, processes or by other users never share files
+		workspace = tempfile.mkdtemp(prefix='glpsol.')
+		try:
+			#the *.lp file goes to the workspace too, unless asked to keep it
+			if not lpfilename:
+				lpfilename = os.path.join(workspace, 'model.lp')
+			solutionfilename = os.path.join(workspace, 'model.sol')
+
+			#write the *.lp file; glpsol numbers rows and columns in the order they first appear in it
+			rownames, colnames = model.write_lp(lpfilename)
+			if stats:
+				#writing the *.lp file is how this backend builds the LP
+				stats.lap('write')
+				stats.count('builds')
+				stats.count('bytes_written', os.path.getsize(lpfilename))
+
+			#-w writes the raw solution (machine readable, by row and column number); the human readable report (-o) only if asked for
+			#glpsol's terminal output (it used to go to a shared glpsol.log) is read from a pipe and shown only if glpsol fails
+			command = ['glpsol', '--cpxlp', lpfilename, '-w', solutionfilename]
+			if reportfilename:
+				command.extend(['-o', reportfilename])
+			try:
+				process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+				log = process.communicate()[0]
+			except OSError, error:
+				log = 'cannot run glpsol: %s' % (error)
+			if stats:
+				stats.lap('run')
+
+			status, objectivevalue, reaction2fluxvalue, reaction2reducedcost, species2shadowprice = '', '', {}, {}, {}
+			if os.path.exists(solutionfilename):
+				status, objectivevalue, colprims, colduals, species2shadowprice = read_raw_solution(solutionfilename, rownames, colnames)
+				#columns that are not reactions (e.g., an objective missing from the model) are left out
+				for ID in colprims:
+					if ID in model.REACTIONS:
+						reaction2fluxvalue[ID], reaction2reducedcost[ID] = colprims[ID], colduals[ID]
+			else:
+				print 'WARNING--glpsol wrote no solution:'
+				print log.rstrip()
+			if stats:
+				stats.lap('parse')
+		finally:
+			shutil.rmtree(workspace, True)
+		if stats:
+			stats.lap('cleanup')
+
+		return status, objectivevalue, reaction2fluxvalue, reaction2reducedcost, species2shadowprice
+
+
+def min_support (model, candidates, limit=None, time_limit=60):
+	"""
+	Smallest set of candidate reactions (irreversible, lower bound 0) that must be allowed to carry flux for the model's LP (model.S
+	and its bounds) to be feasible: a MILP with a binary per candidate (flux <= upper bound * binary), minimizing the number switched on,
+	solved by GLPK's branch and cut for at most time_limit seconds; limit, if given, caps the number switched on.
+	Returns (status, [candidate, ...]): status is 'OPTIMAL', 'FEASIBLE' (time ran out) or another GLPK_STATUS word, with no candidates.
+	"""
+	assert GLPK, 'GLPK shared library not found; the MILP needs it.'
+	GLPK_LOCK.acquire()
+	try:
+		session = glpk_session()
+		session.build(model)
+		lp, reaction2col = session.lp, session.reaction2col
+		#the objective is the number of candidates switched on
+		if model.OBJECTIVE[1] in reaction2col:
+			GLPK.glp_set_obj_coef(lp, reaction2col[model.OBJECTIVE[1]], 0.0)
+		GLPK.glp_set_obj_dir(lp, GLP_MIN)
+		first = GLPK.glp_add_cols(lp, len(candidates))
+		rows = GLPK.glp_add_rows(lp, len(candidates) + int(limit is not None))
+		ind, val = (ctypes.c_int * (len(candidates) + 1))(), (ctypes.c_double * (len(candidates) + 1))()
+		for k, reaction in enumerate(candidates):
+			GLPK.glp_set_col_kind(lp, first + k, GLP_BV)
+			GLPK.glp_set_obj_coef(lp, first + k, 1.0)
+			#flux - upper bound * binary <= 0
+			ind[1], ind[2] = reaction2col[reaction], first + k
+			val[1], val[2] = 1.0, -model.S.bounds(reaction)[1]
+			GLPK.glp_set_mat_row(lp, rows + k, 2, ind, val)
+			GLPK.glp_set_row_bnds(lp, rows + k, GLP_UP, 0.0, 0.0)
+		if limit is not None:
+			for k in range(len(candidates)):
+				ind[k + 1], val[k + 1] = first + k, 1.0
+			GLPK.glp_set_mat_row(lp, rows + len(candidates), len(candidates), ind, val)
+			GLPK.glp_set_row_bnds(lp, rows + len(candidates), GLP_UP, 0.0, float(limit))
+
+		parm = iocp()
+		GLPK.glp_init_iocp(ctypes.byref(parm))
+		parm.msg_lev = 0
+		parm.presolve = GLP_ON
+		parm.tm_lim = int(time_limit * 1000)
+		#a small flux needs only a tiny binary (flux / upper bound); the default integrality tolerance (1e-5) would round it to 0
+		parm.tol_int = 1e-10
+		GLPK.glp_intopt(lp, ctypes.byref(parm))
+		status = GLPK_STATUS.get(GLPK.glp_mip_status(lp), 'UNDEFINED')
+		chosen = []
+		if status in ('OPTIMAL', 'FEASIBLE'):
+			chosen = [reaction for k, reaction in enumerate(candidates)
+						if GLPK.glp_mip_col_val(lp, first + k) > 0.5 or GLPK.glp_mip_col_val(lp, reaction2col[reaction]) > 1e-9]
+		session.close()
+	finally:
+		GLPK_LOCK.release()
+	return status, chosen
+
+
+class solution_cache:
+	"Least recently used store of solve results, keyed by the state of the LP (see key); counts hits and misses."
+
+	def __init__ (self, size=128):
+		self.size = size
+		self.entries = OrderedDict()
+		self.hits, self.misses = 0, 0
+
+
+	def key (self, model, duals=True):
+		#digest of everything a solve depends on once the reactions are fixed: backend, objective, VMAX and the bounds in effect
+		#(and whether the duals were asked for, since a result without them cannot stand in for one with them)
+		digest = hashlib.sha1(repr((model.SOLVER, model.OBJECTIVE, model.VMAX, duals)))
+		digest.update(model.S.lb.tostring())
+		digest.update(model.S.ub.tostring())
+		return digest.digest()
+
+
+	def get (self, key):
+		#the backend result (status, objectivevalue, reaction2fluxvalue, ...) stored under key, or None; a hit becomes the most recently used entry
+		if not key in self.entries:
+			self.misses += 1
+			return None
+		self.hits += 1
+		result = self.entries.pop(key)
+		self.entries[key] = result
+		return result
+
+
+	def put (self, key, result):
+		self.entries[key] = result
+		while len(self.entries) > self.size:
+			self.entries.popitem(last=False)
+
+
+	def clear (self):
+		#drop the stored results (the reactions changed); the counters keep running
+		self.entries.clear()
+
+
+	def stats (self):
+		return {'hits':self.hits, 'misses':self.misses, 'entries':len(self.entries), 'size':self.size}
+
+
+class solve_stats:
+	"Timings and counters of solves (see cb.set_stats): seconds per phase of the last solve and in total, LPs solved, bytes written, ..."
+	#phases: 'cache' (solve cache lookup), 'build' (LP built or updated in memory), 'write' (*.lp file), 'run' (simplex / glpsol),
+	#'parse' (solution read back), 'cleanup' (tmp files removed), 'report' (list_reactions or the flux store after the solve)
+
+	def __init__ (self, callback=None):
+		#callback(last, model) is called after every solve with the phase timings of that solve
+		self.callback = callback
+		self.reset()
+
+
+	def reset (self):
+		self.calls = 0
+		self.totals = {}
+		self.counters = {'lps_solved':0, 'cache_hits':0, 'builds':0, 'warm_starts':0, 'bytes_written':0}
+		self.last = {}
+		self.mark = 0.0
+
+
+	def begin (self):
+		#start timing a solve
+		self.last = {}
+		self.mark = time.time()
+
+
+	def lap (self, phase):
+		#charge the time since the last mark to phase
+		now = time.time()
+		self.last[phase] = self.last.get(phase, 0.0) + now - self.mark
+		self.mark = now
+
+
+	def count (self, counter, n=1):
+		self.counters[counter] = self.counters.get(counter, 0) + n
+
+
+	def end (self, model):
+		#add the solve just timed to the totals and pass it to the callback
+		self.calls += 1
+		for phase in self.last:
+			self.totals[phase] = self.totals.get(phase, 0.0) + self.last[phase]
+		if self.callback:
+			self.callback(dict(self.last), model)
+
+
+	def report (self):
+		return {'calls':self.calls, 'last':dict(self.last), 'totals':dict(self.totals), 'counters':dict(self.counters)}
+
+
+#name -> backend class, for cb.set_solver
+BACKENDS = {'glpk':glpk_backend, 'glpsol':glpsol_backend}
+
+
+def default_backend ():
+	#in-process GLPK if the library could be loaded, otherwise fall back to the glpsol executable
+	if GLPK:
+		return 'glpk'
+	return 'glpsol'
@@ -0,0 +1,176 @@
+#script purpose: compiled sparse stoichiometric matrix for metmodelCLI.cb
+	#kept up to date by cb.add_reaction / delete_reaction / set_constraint / ..., read by the LP backends and write_lp
+	#uses only the standard array module
+
+"""
+data structures in an smatrix:
+
+reactions -> [ reactionID, ... ]				index in this list = column of S, and position in lb / ub
+reaction2index -> { reactionID : column }
+metabolites -> [ speciesID, ... ]				index in this list = row of S
+metabolite2index -> { speciesID : row }
+balanced -> array('b')							1 if the row is mass balanced, 0 for boundary species ('_b' suffix)
+columns -> [ (array('i') rows, array('d') coefficients), ... ]		one per reaction; reactants negative, products positive
+lb, ub -> array('d')							flux bounds in effect for each reaction
+
+Each column is replaced, never changed in place, so copies of an smatrix (copy.deepcopy) share the column arrays.
+
+The flat compressed forms are built from the columns on request and cached until the next reaction is added or deleted:
+csc() -> (indptr, rows, coefficients)			column j is rows[indptr[j]:indptr[j+1]]
+csr() -> (indptr, columns, coefficients)		row i is columns[indptr[i]:indptr[i+1]]
+
+pack() gives the matrix as plain values (lists, dictionaries, strings; arrays as their bytes) for the compiled model cache; unpack() makes it again.
+"""
+
+from array import array		#standard Python module
+
+
+class smatrix:
+	"Sparse stoichiometric matrix S (metabolites x reactions) with float coefficients, index maps and bound vectors."
+
+	def __init__ (self):
+		self.reactions = []
+		self.reaction2index = {}
+		self.metabolites = []
+		self.metabolite2index = {}
+		self.balanced = array('b')
+		self.columns = []
+		self.lb = array('d')
+		self.ub = array('d')
+		self.compiled = {}
+
+
+	def __deepcopy__ (self, memo):
+		#new lists, dictionaries and bound vectors; the (never modified) column arrays are shared
+		other = smatrix()
+		other.reactions, other.reaction2index = list(self.reactions), self.reaction2index.copy()
+		other.metabolites, other.metabolite2index = list(self.metabolites), self.metabolite2index.copy()
+		other.balanced, other.columns = array('b', self.balanced), list(self.columns)
+		other.lb, other.ub = array('d', self.lb), array('d', self.ub)
+		return other
+
+
+	def pack (self):
+		#{ attribute : plain value }; arrays as bytes (native byte order), compiled forms left out
+		return {'reactions':self.reactions, 'reaction2index':self.reaction2index, 'metabolites':self.metabolites,
+				'metabolite2index':self.metabolite2index, 'balanced':self.balanced.tostring(),
+				'columns':[(rows.tostring(), coefs.tostring()) for rows, coefs in self.columns],
+				'lb':self.lb.tostring(), 'ub':self.ub.tostring()}
+
+
+	def metabolite (self, species):
+		#row of a species, adding the row if this is the first time it is seen
+		if species in self.metabolite2index:
+			return self.metabolite2index[species]
+		row = len(self.metabolites)
+		self.metabolites.append(species)
+		self.metabolite2index[species] = row
+		if '_b' == species[-2:]:
+			self.balanced.append(0)
+		else:
+			self.balanced.append(1)
+		return row
+
+
+	def add_reaction (self, ID, equation, lbound, ubound):
+		#append a column for a reaction; equation is [[(reactant, coef), ...], [(product, coef), ...]]
+		entries = {}
+		for i, side in enumerate(equation):
+			sign = (i * 2) - 1
+			for species, coef in side:
+				row = self.metabolite(species)
+				entries[row] = entries.get(row, 0.0) + sign * float(coef)
+		#species on both sides of the equation are netted; entries that cancel are left out
+		rows = [row for row in entries if entries[row] != 0]
+		rows.sort()
+		self.add_column(ID, (array('i', rows), array('d', [entries[row] for row in rows])), lbound, ubound)
+
+
+	def add_column (self, ID, column, lbound, ubound):
+		#append a compiled column, (array('i') rows, array('d') coefficients), for a reaction (or a lump of reactions, see compression.py)
+		self.reaction2index[ID] = len(self.reactions)
+		self.reactions.append(ID)
+		self.columns.append(column)
+		self.lb.append(float(lbound))
+		self.ub.append(float(ubound))
+		self.compiled = {}
+
+
+	def delete_reaction (self, ID):
+		#remove a reaction's column; the last column moves into its place, so indices stay dense
+		j = self.reaction2index.pop(ID)
+		last = len(self.reactions) - 1
+		if j != last:
+			moved = self.reactions[last]
+			self.reactions[j] = moved
+			self.columns[j] = self.columns[last]
+			self.lb[j], self.ub[j] = self.lb[last], self.ub[last]
+			self.reaction2index[moved] = j
+		del self.reactions[last]
+		del self.columns[last]
+		del self.lb[last]
+		del self.ub[last]
+		self.compiled = {}
+
+
+	def set_bounds (self, ID, lbound, ubound):
+		j = self.reaction2index[ID]
+		self.lb[j], self.ub[j] = float(lbound), float(ubound)
+
+
+	def bounds (self, ID):
+		j = self.reaction2index[ID]
+		return self.lb[j], self.ub[j]
+
+
+	def csc (self):
+		#compressed sparse column form of S
+		if not 'csc' in self.compiled:
+			indptr, rows, coefs = array('i', [0]), array('i'), array('d')
+			for colrows, colcoefs in self.columns:
+				rows.extend(colrows)
+				coefs.extend(colcoefs)
+				indptr.append(len(rows))
+			self.compiled['csc'] = (indptr, rows, coefs)
+		return self.compiled['csc']
+
+
+	def csr (self):
+		#compressed sparse row form of S (the transpose of the column form)
+		if not 'csr' in self.compiled:
+			counts = [0] * len(self.metabolites)
+			for colrows, colcoefs in self.columns:
+				for row in colrows:
+					counts[row] += 1
+			indptr = array('i', [0])
+			for count in counts:
+				indptr.append(indptr[-1] + count)
+			nonzeros = indptr[-1]
+			cols, coefs = array('i', [0]) * nonzeros, array('d', [0.0]) * nonzeros
+			fill = list(indptr[:-1])
+			for j, (colrows, colcoefs) in enumerate(self.columns):
+				for row, coef in zip(colrows, colcoefs):
+					k = fill[row]
+					cols[k], coefs[k] = j, coef
+					fill[row] = k + 1
+			self.compiled['csr'] = (indptr, cols, coefs)
+		return self.compiled['csr']
+
+
+def from_bytes (typecode, data):
+	values = array(typecode)
+	values.fromstring(data)
+	return values
+
+
+def unpack (packed):
+	"The smatrix a pack() gave."
+	S = smatrix()
+	S.reactions, S.reaction2index = packed['reactions'], packed['reaction2index']
+	S.metabolites, S.metabolite2index = packed['metabolites'], packed['metabolite2index']
+	S.balanced = from_bytes('b', packed['balanced'])
+	S.columns = [(from_bytes('i', rows), from_bytes('d', coefs)) for rows, coefs in packed['columns']]
+	S.lb, S.ub = from_bytes('d', packed['lb']), from_bytes('d', packed['ub'])
+	if not len(S.reactions) == len(S.columns) == len(S.lb) == len(S.ub) or len(S.metabolites) != len(S.balanced):
+		raise ValueError('packed matrix has inconsistent sizes')
+	return S